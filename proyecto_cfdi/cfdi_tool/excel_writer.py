@@ -3,136 +3,382 @@ excel_writer.py
 
 Funciones para exportar la información extraída de CFDI a un archivo Excel.
 
-La función principal `exportar_a_excel` espera una lista de diccionarios con la
-estructura resultante del extractor y genera un archivo Excel con varias hojas:
+La función principal `exportar_a_excel` espera un iterable (lista o generador)
+de diccionarios con la estructura resultante del extractor y genera un archivo Excel con varias hojas:
 - `CFDI_General`: resumen por comprobante
 - `Conceptos`: todos los conceptos relacionados a cada comprobante
 - `Documentos Relacionados`: si existen (por ejemplo en complementos de pagos)
 
-Requiere `pandas` y `openpyxl` como engine para escritura Excel.
+Si `xlsxwriter` está instalado se usa en modo `constant_memory`, que vuelca
+cada fila a disco en cuanto se escribe. Si no, se recurre a `openpyxl` con un
+libro `write_only`. En ambos casos no se mantiene una celda por valor en
+memoria.
+
+Para lotes grandes `exportar_a_parquet` escribe las mismas tres tablas como
+archivos Parquet (columnar, comprimido con Snappy). Requiere `pyarrow`, que es
+opcional.
 """
 
-import pandas as pd
+import itertools
+import os
+
+from openpyxl import Workbook
+
+try:
+    import xlsxwriter
+except ImportError:
+    # xlsxwriter es opcional: sin él se escribe con openpyxl
+    xlsxwriter = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow sólo se necesita para la exportación a Parquet
+    pa = None
+    pq = None
+
+# Permite a las interfaces saber antes de procesar si Parquet está disponible
+PARQUET_DISPONIBLE = pa is not None
+
+
+# Orden de columnas de cada hoja. Se fijan a nivel de módulo para escribir el
+# encabezado una sola vez y armar cada fila como tupla en el mismo orden.
+COLUMNAS_GENERAL = (
+    'UUID',
+    'Fecha',
+    'Tipo Comprobante',
+    'Metodo de Pago',
+    'Serie',
+    'Folio',
+    'Subtotal',
+    'tasa_cuota',
+    'importe',
+    'Total',
+    'Moneda',
+    'Descripcion',
+    'Emisor RFC',
+    'Emisor Nombre',
+    'Receptor RFC',
+    'Receptor Nombre',
+    'Uso CFDI',
+    'RegimenFiscalReceptor',
+    'lugar_expedicion',
+    'receptor_domicilio_fiscal_receptor',
+)
+
+COLUMNAS_CONCEPTOS = (
+    'UUID_CFDI',
+    'ClaveProdServ',
+    'Descripcion',
+    'Cantidad',
+    'ClaveUnidad',
+    'ValorUnitario',
+    'Importe',
+    'Descuento',
+)
+
+COLUMNAS_DOCUMENTOS_RELACIONADOS = (
+    'UUID_CFDI',
+    'UUID_Pago',
+    'IdDocumento',
+    'Serie',
+    'Folio',
+    'MonedaDR',
+    'ImpSaldoAnt',
+    'ImpPagado',
+    'ImpSaldoInsoluto',
+    'BaseDR',
+    'TasaOCuotaDR',
+    'ImporteDR',
+)
+
+# Columnas con importes y cantidades; en Parquet se guardan como float64
+COLUMNAS_NUMERICAS = frozenset({
+    'Subtotal', 'tasa_cuota', 'importe', 'Total',
+    'Cantidad', 'ValorUnitario', 'Importe', 'Descuento',
+    'ImpSaldoAnt', 'ImpPagado', 'ImpSaldoInsoluto', 'BaseDR', 'TasaOCuotaDR', 'ImporteDR',
+})
+
+
+def _filas_cfdi(datos):
+    """Construye las filas de un CFDI para cada hoja.
+
+    Devuelve una tupla `(fila_general, filas_conceptos, filas_documentos)`,
+    donde cada fila es una tupla con el orden de las columnas del módulo.
+    """
+    # Resolver cada sección una sola vez por CFDI
+    dg = datos.get('datos_generales') or {}
+    em = datos.get('emisor') or {}
+    rc = datos.get('receptor') or {}
+    tb = datos.get('timbre') or {}
+
+    # Obtener UUID del timbre si está disponible, si no usar un valor por defecto
+    uuid = tb.get('uuid', 'SIN_UUID')
+
+    # Obtener el primer concepto si existe (para la descripción en la hoja general)
+    conceptos = datos.get('conceptos') or []
+    primer_concepto = conceptos[0] if conceptos else {}
+    # Impuestos a nivel comprobante (no los de cada concepto)
+    traslados = (datos.get('impuestos') or {}).get('traslados', [])
+
+    # Fila de la hoja general con campos comunes (orden de COLUMNAS_GENERAL)
+    fila_general = (
+        uuid,
+        dg.get('fecha'),
+        dg.get('tipo_comprobante'),
+        dg.get('metodo_pago'),
+        dg.get('serie'),
+        dg.get('folio'),
+        dg.get('subtotal'),
+        traslados[0].get('tasa_cuota') if traslados else 'SIN_TASA',
+        traslados[0].get('importe') if traslados else 'SIN_IMPORTE',
+        dg.get('total'),
+        dg.get('moneda'),
+        primer_concepto.get('descripcion'),
+        em.get('rfc'),
+        em.get('nombre'),
+        rc.get('rfc'),
+        rc.get('nombre'),
+        rc.get('uso_cfdi'),
+        rc.get('regimen_fiscal'),
+        dg.get('lugar_expedicion'),
+        rc.get('domicilio_fiscal_receptor'),
+    )
+
+    # Una fila por cada concepto del CFDI, relacionada por UUID
+    filas_conceptos = [
+        (
+            uuid,
+            concepto.get('clave_prod_serv'),
+            concepto.get('descripcion'),
+            concepto.get('cantidad'),
+            concepto.get('clave_unidad'),
+            concepto.get('valor_unitario'),
+            concepto.get('importe'),
+            concepto.get('descuento'),
+        )
+        for concepto in conceptos
+    ]
+
+    # Si existen complementos (por ejemplo pagos), construir filas para documentos relacionados
+    filas_documentos = []
+    complementos = datos.get('complementos') or {}
+    for pago in complementos.get('pagos', []):
+        # El pago puede tener su propio UUID o usar el del CFDI
+        uuid_pago = pago.get('uuid', uuid)
+        for doc_rel in pago.get('documentos_relacionados', []):
+            # Extraer el primer traslado si existe (puede haber múltiples)
+            traslados_dr = doc_rel.get('traslados_dr', [])
+            primer_traslado = traslados_dr[0] if traslados_dr else {}
+
+            filas_documentos.append((
+                uuid,  # UUID del CFDI principal
+                uuid_pago,  # UUID del pago si aplica
+                doc_rel.get('id_documento'),
+                doc_rel.get('serie'),
+                doc_rel.get('folio'),
+                doc_rel.get('moneda'),
+                doc_rel.get('imp_saldo_ant'),
+                doc_rel.get('imp_pagado'),
+                doc_rel.get('imp_saldo_insoluto'),
+                primer_traslado.get('base'),
+                primer_traslado.get('tasa_cuota'),
+                primer_traslado.get('importe'),
+            ))
+
+    return fila_general, filas_conceptos, filas_documentos
+
+
+def _nuevas_columnas(columnas):
+    """Crea el diccionario encabezado -> lista vacía y los `append` en orden."""
+    cols = {c: [] for c in columnas}
+    return cols, [cols[c].append for c in columnas]
+
+
+def _acumular_columnas(datos_cfdi):
+    """Recorre los CFDI y acumula los valores de cada hoja por columna.
+
+    Devuelve tres diccionarios (general, conceptos y documentos relacionados)
+    cuyas llaves son los encabezados y cuyos valores son listas paralelas, una
+    entrada por fila. Cada valor va directo a su columna, sin conservar las
+    tuplas de fila ni transponerlas al final.
+    """
+    cols_general, agregar_general = _nuevas_columnas(COLUMNAS_GENERAL)
+    cols_conceptos, agregar_conceptos = _nuevas_columnas(COLUMNAS_CONCEPTOS)
+    cols_documentos, agregar_documentos = _nuevas_columnas(COLUMNAS_DOCUMENTOS_RELACIONADOS)
+
+    for datos in datos_cfdi:
+        general, conceptos, documentos = _filas_cfdi(datos)
+        for agregar, valor in zip(agregar_general, general):
+            agregar(valor)
+        for fila in conceptos:
+            for agregar, valor in zip(agregar_conceptos, fila):
+                agregar(valor)
+        for fila in documentos:
+            for agregar, valor in zip(agregar_documentos, fila):
+                agregar(valor)
+
+    return cols_general, cols_conceptos, cols_documentos
+
+
+def _hoja_xlsxwriter(libro, nombre, encabezado):
+    """Crea una hoja de xlsxwriter y devuelve una función para agregar filas."""
+    hoja = libro.add_worksheet(nombre)
+    hoja.write_row(0, 0, encabezado)
+    numero_fila = itertools.count(1)
 
+    def agregar(fila):
+        hoja.write_row(next(numero_fila), 0, fila)
 
-def exportar_a_excel(lista_datos_cfdi, ruta_salida):
-    """Exporta una lista de datos CFDI a un archivo Excel con hojas separadas.
+    return agregar
+
+
+def _hoja_openpyxl(libro, nombre, encabezado):
+    """Crea una hoja `write_only` de openpyxl y devuelve su `append`."""
+    hoja = libro.create_sheet(nombre)
+    hoja.append(encabezado)
+    return hoja.append
+
+
+def exportar_a_excel(datos_cfdi, ruta_salida):
+    """Exporta datos CFDI a un archivo Excel con hojas separadas.
 
     Parámetros:
-    - lista_datos_cfdi (list): Lista de diccionarios con la información extraída.
+    - datos_cfdi (iterable): Diccionarios con la información extraída. Puede
+      ser una lista o un generador; se recorre una sola vez.
     - ruta_salida (str): Ruta (incluido nombre) donde guardar el archivo .xlsx.
 
-    La función crea tres DataFrames intermedios y los escribe en hojas separadas.
-    En caso de error durante la escritura, captura la excepción y la muestra.
+    Cada CFDI se convierte en filas que se escriben de inmediato, sin
+    acumular el lote completo en memoria: con xlsxwriter (`constant_memory`)
+    si está disponible y, si no, con un libro `write_only` de openpyxl. En
+    caso de error durante la escritura, captura la excepción y la muestra.
+
+    Devuelve True si el archivo se guardó y False si no había datos o la
+    escritura falló, para que quien llama no reporte un éxito inexistente.
     """
 
     print(f"\n--- Iniciando la exportación a Excel ---")
-    print(f"Se exportarán datos de {len(lista_datos_cfdi)} CFDI.")
-
-    # Listas intermedias para construir DataFrames
-    filas_general = []
-    filas_conceptos = []
-    filas_documentos_relacionados = []
-
-    # Recorrer cada elemento (CFDI) y desestructurar la información necesaria
-    for datos in lista_datos_cfdi:
-        # Obtener UUID del timbre si está disponible, si no usar un valor por defecto
-        uuid = datos.get('timbre', {}).get('uuid', 'SIN_UUID')
-        
-        # Obtener el primer concepto si existe (para la descripción en la hoja general)
-        conceptos = datos.get('conceptos', [])
-        primer_concepto = conceptos[0] if conceptos else {}
-        traslados = datos.get('impuestos', {}).get('traslados', [])
-
-        # Construir fila para la hoja general con campos comunes
-        fila_gen = {
-            'UUID': uuid,
-            'Fecha': datos.get('datos_generales', {}).get('fecha'),
-            'Tipo Comprobante': datos.get('datos_generales', {}).get('tipo_comprobante'),
-            'Metodo de Pago': datos.get('datos_generales', {}).get('metodo_pago'),
-            'Serie': datos.get('datos_generales', {}).get('serie'),
-            'Folio': datos.get('datos_generales', {}).get('folio'),
-            'Subtotal': datos.get('datos_generales', {}).get('subtotal'),
-            'tasa_cuota': traslados[0].get('tasa_cuota') if traslados else 'SIN_TASA', 
-            'importe': traslados[0].get('importe') if traslados else 'SIN_IMPORTE',
-            'Total': datos.get('datos_generales', {}).get('total'),
-            'Moneda': datos.get('datos_generales', {}).get('moneda'),
-            'Descripcion': primer_concepto.get('descripcion'),
-            'Emisor RFC': datos.get('emisor', {}).get('rfc'),
-            'Emisor Nombre': datos.get('emisor', {}).get('nombre'),
-            'Receptor RFC': datos.get('receptor', {}).get('rfc'),
-            'Receptor Nombre': datos.get('receptor', {}).get('nombre'),
-            'Uso CFDI': datos.get('receptor', {}).get('uso_cfdi'),
-            'RegimenFiscalReceptor': datos.get('receptor', {}).get('regimen_fiscal'),
-            'lugar_expedicion': datos.get('datos_generales', {}).get('lugar_expedicion'),
-            'receptor_domicilio_fiscal_receptor': datos.get('receptor', {}).get('domicilio_fiscal_receptor'),
-        }
-        filas_general.append(fila_gen)
-
-        # Agregar una fila por cada concepto del CFDI (relacionada por UUID)
-        for concepto in datos.get('conceptos', []):
-            fila_con = {
-                'UUID_CFDI': uuid,  # para relacionar con la hoja general
-                'ClaveProdServ': concepto.get('clave_prod_serv'),
-                'Descripcion': concepto.get('descripcion'),
-                'Cantidad': concepto.get('cantidad'),
-                'ClaveUnidad': concepto.get('clave_unidad'),
-                'ValorUnitario': concepto.get('valor_unitario'),
-                'Importe': concepto.get('importe'),
-                'Descuento': concepto.get('descuento'),
-            }
-            filas_conceptos.append(fila_con)
-
-        # Si existen complementos (por ejemplo pagos), construir filas para documentos relacionados
-        complementos = datos.get('complementos', {})
-        if 'pagos' in complementos:
-            for pago in complementos['pagos']:
-                # El pago puede tener su propio UUID o usar el del CFDI
-                uuid_pago = pago.get('uuid', uuid)
-                for doc_rel in pago.get('documentos_relacionados', []):
-                    # Extraer el primer traslado si existe (puede haber múltiples)
-                    traslados = doc_rel.get('traslados_dr', [])
-                    primer_traslado = traslados[0] if traslados else {}
-                    
-                    fila_doc_rel = {
-                        'UUID_CFDI': uuid,  # UUID del CFDI principal
-                        'UUID_Pago': uuid_pago,  # UUID del pago si aplica
-                        'IdDocumento': doc_rel.get('id_documento'),
-                        'Serie': doc_rel.get('serie'),
-                        'Folio': doc_rel.get('folio'),
-                        'MonedaDR': doc_rel.get('moneda'),
-                        'ImpSaldoAnt': doc_rel.get('imp_saldo_ant'),
-                        'ImpPagado': doc_rel.get('imp_pagado'),
-                        'ImpSaldoInsoluto': doc_rel.get('imp_saldo_insoluto'),
-                        'BaseDR': primer_traslado.get('base'),
-                        #'ImpuestoDR': primer_traslado.get('impuesto'),
-                        #'TipoFactorDR': primer_traslado.get('tipo_factor'),
-                        'TasaOCuotaDR': primer_traslado.get('tasa_cuota'),
-                        'ImporteDR': primer_traslado.get('importe')
-                    }
-                    filas_documentos_relacionados.append(fila_doc_rel)
-
-    # Si no hay filas generales, no tiene sentido generar el archivo
-    if not filas_general:
-        print("No hay datos generales para exportar.")
-        return
 
     try:
-        # Crear DataFrames a partir de las listas preparadas
-        df_general = pd.DataFrame(filas_general)
-        df_conceptos = pd.DataFrame(filas_conceptos)
-        df_documentos_relacionados = pd.DataFrame(filas_documentos_relacionados)
-
-        # Escribir a Excel. Se usa openpyxl como engine para compatibilidad con .xlsx
-        with pd.ExcelWriter(ruta_salida, engine='openpyxl') as writer:
-            df_general.to_excel(writer, sheet_name='CFDI_General', index=False)
-            df_conceptos.to_excel(writer, sheet_name='Conceptos', index=False)
-            # Escribir la hoja de documentos relacionados sólo si tiene datos
-            if not df_documentos_relacionados.empty:
-                df_documentos_relacionados.to_excel(writer, sheet_name='Documentos Relacionados', index=False)
+        # Si no hay filas generales, no tiene sentido generar el archivo
+        datos_cfdi = iter(datos_cfdi)
+        primero = next(datos_cfdi, None)
+        if primero is None:
+            print("No hay datos generales para exportar.")
+            return False
+
+        if xlsxwriter is not None:
+            # constant_memory vuelca cada fila al archivo temporal de su hoja;
+            # strings_to_urls desactivado para conservar el texto tal cual
+            libro = xlsxwriter.Workbook(
+                ruta_salida,
+                {'constant_memory': True, 'use_zip64': True, 'strings_to_urls': False},
+            )
+            nueva_hoja = _hoja_xlsxwriter
+            guardar = libro.close
+        else:
+            # Libro en modo streaming: cada `append` serializa la fila de inmediato
+            libro = Workbook(write_only=True)
+            nueva_hoja = _hoja_openpyxl
+            guardar = lambda: libro.save(ruta_salida)
+
+        agregar_general = nueva_hoja(libro, 'CFDI_General', COLUMNAS_GENERAL)
+        agregar_concepto = nueva_hoja(libro, 'Conceptos', COLUMNAS_CONCEPTOS)
+        # La hoja de documentos relacionados sólo se crea si hay datos
+        agregar_documento = None
 
+        total = 0
+        for datos in itertools.chain((primero,), datos_cfdi):
+            general, conceptos, documentos = _filas_cfdi(datos)
+            agregar_general(general)
+            for fila in conceptos:
+                agregar_concepto(fila)
+            if documentos:
+                if agregar_documento is None:
+                    agregar_documento = nueva_hoja(
+                        libro, 'Documentos Relacionados', COLUMNAS_DOCUMENTOS_RELACIONADOS
+                    )
+                for fila in documentos:
+                    agregar_documento(fila)
+            total += 1
+
+        guardar()
+
+        print(f"Se exportaron datos de {total} CFDI.")
         print(f"✅ ¡Éxito! Archivo guardado en: {ruta_salida}")
+        return True
 
     except Exception as e:
         # Mensaje informativo para facilitar el diagnóstico en caso de fallo
         print(f"❌ Error al escribir el archivo Excel: {e}")
+        return False
+
+
+def _tabla_arrow(columnas):
+    """Construye una tabla de pyarrow con las columnas numéricas ya tipadas.
+
+    Las columnas de `COLUMNAS_NUMERICAS` se convierten directamente a buffers
+    float64 (los `None` quedan como nulos); el resto se deja a la inferencia
+    de tipos de pyarrow.
+    """
+    return pa.table({
+        nombre: pa.array(valores, type=pa.float64()) if nombre in COLUMNAS_NUMERICAS
+        else pa.array(valores)
+        for nombre, valores in columnas.items()
+    })
+
+
+def exportar_a_parquet(datos_cfdi, out_dir):
+    """Exporta datos CFDI a archivos Parquet, uno por tabla.
+
+    Parámetros:
+    - datos_cfdi (iterable): Diccionarios con la información extraída (lista
+      o generador).
+    - out_dir (str): Carpeta donde se guardan `cfdi_general.parquet`,
+      `cfdi_conceptos.parquet` y, si hay datos, `cfdi_documentos_relacionados.parquet`.
+
+    Usa las mismas columnas que las hojas de Excel. Lanza `ImportError` si
+    `pyarrow` no está instalado; otros errores de escritura se capturan y se
+    muestran, igual que en `exportar_a_excel`. Devuelve True si se guardaron
+    los archivos y False en caso contrario.
+    """
+    if pa is None:
+        raise ImportError("Se requiere pyarrow para exportar a Parquet.")
+
+    print("\n--- Iniciando la exportación a Parquet ---")
+
+    cols_general, cols_conceptos, cols_documentos_relacionados = _acumular_columnas(
+        datos_cfdi
+    )
+
+    if not cols_general['UUID']:
+        print("No hay datos generales para exportar.")
+        return False
+    print(f"Se exportarán datos de {len(cols_general['UUID'])} CFDI.")
+
+    # Parquet es tipado: los marcadores de texto de la hoja general
+    # ('SIN_TASA', 'SIN_IMPORTE') se guardan como nulos en columnas numéricas
+    for columna in ('tasa_cuota', 'importe'):
+        cols_general[columna] = [
+            None if isinstance(v, str) else v for v in cols_general[columna]
+        ]
+
+    tablas = {
+        'cfdi_general.parquet': cols_general,
+        'cfdi_conceptos.parquet': cols_conceptos,
+    }
+    if cols_documentos_relacionados['UUID_CFDI']:
+        tablas['cfdi_documentos_relacionados.parquet'] = cols_documentos_relacionados
+
+    try:
+        for nombre, columnas in tablas.items():
+            tabla = _tabla_arrow(columnas)
+            pq.write_table(tabla, os.path.join(out_dir, nombre), compression='snappy')
+
+        print(f"✅ ¡Éxito! Archivos Parquet guardados en: {out_dir}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error al escribir los archivos Parquet: {e}")
+        return False
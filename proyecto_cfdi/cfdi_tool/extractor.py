@@ -11,11 +11,81 @@ Buenas prácticas aplicadas:
 - Docstrings en módulo y métodos
 - Manejo de excepciones controlado
 - Comentarios breves en bloques clave para facilitar mantenimiento
+
+Los mensajes por archivo se registran con `logging` (nivel DEBUG) en lugar de
+imprimirse, para no saturar la salida estándar al procesar lotes grandes.
+
+El parseo se hace con `lxml`, y todas las rutas XPath se compilan una sola
+vez al crear el extractor para reutilizarlas en cada archivo.
 """
 
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
+import functools
+import itertools
+import logging
+import mmap
 import os
+import sys
+import threading
+from collections import deque
 from datetime import datetime
+from types import MappingProxyType
+
+
+logger = logging.getLogger(__name__)
+
+# Namespaces comunes que pueden aparecer en distintos CFDI/Complementos
+_NS = MappingProxyType({
+    "cfdi": "http://www.sat.gob.mx/cfd/4",
+    "cfdi33": "http://www.sat.gob.mx/cfd/3",  # Para CFDI 3.3
+    "tfd": "http://www.sat.gob.mx/TimbreFiscalDigital",
+    "pago20": "http://www.sat.gob.mx/Pagos20",
+    "pago10": "http://www.sat.gob.mx/Pagos",  # Versión anterior
+    "nomina12": "http://www.sat.gob.mx/nomina12",
+    "cartaporte31": "http://www.sat.gob.mx/CartaPorte31",
+})
+
+# A partir de este tamaño el XML se mapea en memoria en lugar de leerse completo
+_UMBRAL_MMAP = 256 * 1024
+
+# Árboles parseados que conserva un extractor creado con `cachear=True`.
+# Sólo sirve a quien relee los mismos archivos con la misma instancia; los
+# lotes de las interfaces visitan cada archivo una vez y no la activan.
+_TAM_CACHE = 128
+
+# Todas las combinaciones de mayúsculas/minúsculas de ".xml", para filtrar
+# nombres de archivo con `str.endswith` sin crear una copia en minúsculas
+EXTENSIONES_XML = tuple(
+    "." + "".join(letras) for letras in itertools.product("xX", "mM", "lL")
+)
+
+# Descripciones legibles de los códigos de TipoDeComprobante
+_TIPOS = MappingProxyType({
+    "I": "Ingreso (Factura)",
+    "E": "Egreso (Nota de Crédito)",
+    "P": "Pago",
+    "N": "Nómina",
+    "T": "Traslado",
+})
+
+
+def _f(valor, defecto=0.0):
+    """Convierte un atributo numérico a float; si falta devuelve `defecto`."""
+    return float(valor) if valor is not None else defecto
+
+
+def _primero(elementos):
+    """Devuelve el primer elemento de un resultado XPath o `None` si está vacío."""
+    return elementos[0] if elementos else None
+
+
+def _i(valor):
+    """Internaliza códigos que se repiten entre comprobantes (RFC, claves SAT).
+
+    Cada `get` de lxml crea un `str` nuevo; al internarlo todas las filas con
+    el mismo código comparten un único objeto en memoria.
+    """
+    return sys.intern(valor) if valor is not None else None
 
 
 class CFDIExtractor:
@@ -27,46 +97,130 @@ class CFDIExtractor:
     - Varios métodos `extraer_*` devuelven partes concretas del CFDI
     """
 
-    def __init__(self):
-        # Namespaces comunes que pueden aparecer en distintos CFDI/Complementos
-        self.namespaces = {
-            "cfdi": "http://www.sat.gob.mx/cfd/4",
-            "cfdi33": "http://www.sat.gob.mx/cfd/3",  # Para CFDI 3.3
-            "tfd": "http://www.sat.gob.mx/TimbreFiscalDigital",
-            "pago20": "http://www.sat.gob.mx/Pagos20",
-            "pago10": "http://www.sat.gob.mx/Pagos",  # Versión anterior
-            "nomina12": "http://www.sat.gob.mx/nomina12",
-            "cartaporte31": "http://www.sat.gob.mx/CartaPorte31",
+    def __init__(self, cachear=False):
+        # Copia por instancia (lxml requiere un dict para compilar las XPath)
+        self.namespaces = dict(_NS)
+
+        # Parser reutilizable: sin espacios en blanco ni tabla de IDs. Un CFDI
+        # no declara entidades propias ni referencia recursos externos, así que
+        # no se expanden entidades ni se permite acceso a red.
+        self._parser = ET.XMLParser(
+            huge_tree=False, remove_blank_text=True, collect_ids=False,
+            resolve_entities=False, no_network=True,
+        )
+
+        # Caché opcional de raíces por (ruta, mtime, tamaño): si el archivo
+        # cambia la clave también, así que nunca se devuelve un árbol
+        # desactualizado. Los errores no se cachean porque `lru_cache` no
+        # guarda excepciones. Desactivada por defecto: en un lote no hay
+        # relecturas y sólo retendría árboles y sumaría un `stat` por archivo.
+        self._parsear_cacheado = None
+        if cachear:
+            self._parsear_cacheado = functools.lru_cache(maxsize=_TAM_CACHE)(
+                self._parsear_por_version
+            )
+
+        # XPath precompiladas (se evalúan llamándolas con el nodo de contexto).
+        # Las rutas siguen la estructura del esquema con hijos directos para
+        # no recorrer todos los descendientes con `.//`.
+        def xp(ruta):
+            return ET.XPath(ruta, namespaces=self.namespaces)
+
+        self._xp_emisor = xp("cfdi:Emisor")
+        self._xp_emisor33 = xp("cfdi33:Emisor")
+        self._xp_receptor = xp("cfdi:Receptor")
+        self._xp_receptor33 = xp("cfdi33:Receptor")
+        self._xp_conceptos = xp("cfdi:Conceptos/cfdi:Concepto")
+        self._xp_conceptos33 = xp("cfdi33:Conceptos/cfdi33:Concepto")
+        self._xp_impuestos = xp("cfdi:Impuestos")
+        self._xp_impuestos33 = xp("cfdi33:Impuestos")
+        self._xp_timbre = xp(".//tfd:TimbreFiscalDigital")
+        self._xp_pagos20 = xp(".//pago20:Pagos")
+        self._xp_pagos10 = xp(".//pago10:Pagos")
+        self._xp_pago20 = xp("pago20:Pago")
+        self._xp_pago10 = xp("pago10:Pago")
+        self._xp_docto20 = xp("pago20:DoctoRelacionado")
+        self._xp_docto10 = xp("pago10:DoctoRelacionado")
+        self._xp_impuestos_dr20 = xp("pago20:ImpuestosDR")
+        self._xp_impuestos_dr10 = xp("pago10:ImpuestosDR")
+        self._xp_traslado_dr20 = xp("pago20:TrasladosDR/pago20:TrasladoDR")
+        self._xp_traslado_dr10 = xp("pago10:TrasladosDR/pago10:TrasladoDR")
+
+        # Prefijos en notación Clark ("{uri}") por namespace, para comparar
+        # tags directamente sin resolver prefijos en cada búsqueda
+        self._T = {prefijo: f"{{{uri}}}" for prefijo, uri in self.namespaces.items()}
+        ns = self._T
+
+        # Tabla de despacho por tag (notación Clark) para recorrer el
+        # comprobante en una sola pasada desde `procesar_cfdi_completo`.
+        self._manejadores = {}
+        for cfdi in (ns["cfdi"], ns["cfdi33"]):
+            self._manejadores[cfdi + "Emisor"] = self._manejar_emisor
+            self._manejadores[cfdi + "Receptor"] = self._manejar_receptor
+            self._manejadores[cfdi + "Conceptos"] = self._manejar_conceptos
+            self._manejadores[cfdi + "Impuestos"] = self._manejar_impuestos
+            self._manejadores[cfdi + "Complemento"] = self._manejar_complemento
+        self._tags_concepto = (ns["cfdi"] + "Concepto", ns["cfdi33"] + "Concepto")
+        self._tags_impuestos = (ns["cfdi"] + "Impuestos", ns["cfdi33"] + "Impuestos")
+        self._grupos_impuestos = {}
+        for cfdi in (ns["cfdi"], ns["cfdi33"]):
+            self._grupos_impuestos[cfdi + "Traslados"] = "traslados"
+            self._grupos_impuestos[cfdi + "Retenciones"] = "retenciones"
+        self._manejadores_complemento = {
+            ns["tfd"] + "TimbreFiscalDigital": self._manejar_timbre,
+            ns["pago20"] + "Pagos": self._manejar_pagos,
+            ns["pago10"] + "Pagos": self._manejar_pagos,
         }
 
     def cargar_cfdi(self, archivo_path):
         """Carga y parsea un archivo XML.
 
-        Valida que el archivo exista y que el contenido sea un XML válido. En
-        caso de error devuelve `None` y muestra un mensaje útil para debug.
+        Si el archivo no existe o no se puede leer, `open` lo reporta con la
+        ruta en el mensaje; si el contenido no es un XML válido, el parser. En
+        ambos casos devuelve `None` y registra un mensaje útil para debug.
+
+        Con `cachear=True` el árbol se reutiliza mientras el archivo no cambie
+        (misma fecha de modificación y tamaño), por lo que no debe modificarse.
         """
         try:
-            if not os.path.exists(archivo_path):
-                raise FileNotFoundError(f"No se encontró el archivo: {archivo_path}")
-
-            tree = ET.parse(archivo_path)
-            root = tree.getroot()
+            if self._parsear_cacheado is None:
+                root = self._parsear(archivo_path)
+            else:
+                st = os.stat(archivo_path)
+                root = self._parsear_cacheado(archivo_path, st.st_mtime_ns, st.st_size)
 
-            # Detectar versión para información al usuario
-            version = self.detectar_version(root)
-            print(f"📄 CFDI Versión {version} cargado correctamente")
+            # Mensaje informativo: basta el atributo Version, sin heurísticas
+            logger.debug("📄 CFDI Versión %s cargado correctamente", root.get("Version") or "Desconocida")
 
             return root
 
         except ET.ParseError as e:
             # Error al parsear XML: normalmente indica XML mal formado
-            print(f"❌ Error al parsear XML: {e}")
+            logger.error("❌ Error al parsear XML %s: %s", archivo_path, e)
             return None
         except Exception as e:
             # Otros errores (permiso, IO, etc.)
-            print(f"❌ Error inesperado: {e}")
+            logger.error("❌ Error inesperado con %s: %s", archivo_path, e)
             return None
 
+    def _parsear(self, archivo_path):
+        """Lee y parsea el archivo; los errores se propagan a `cargar_cfdi`."""
+        # Leer los bytes y entregarlos al parser; los archivos grandes se
+        # mapean en memoria para que el parser consuma el buffer sin copiarlo
+        with open(archivo_path, "rb") as archivo:
+            if os.fstat(archivo.fileno()).st_size > _UMBRAL_MMAP:
+                with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+                    return ET.fromstring(datos, self._parser)
+            return ET.fromstring(archivo.read(), self._parser)
+
+    def _parsear_por_version(self, archivo_path, mtime_ns, tamano):
+        """Envoltura de `_parsear` cuyos argumentos forman la clave de caché."""
+        return self._parsear(archivo_path)
+
+    def _es_cfdi33(self, root):
+        """Indica si el comprobante usa el namespace de CFDI 3.3."""
+        return root.tag.startswith(self._T["cfdi33"])
+
     def detectar_version(self, root):
         """Intenta determinar la versión del CFDI.
 
@@ -93,59 +247,53 @@ class CFDIExtractor:
             "serie": root.get("Serie", "Sin Serie"),
             "folio": root.get("Folio", "Sin Folio"),
             "fecha": root.get("Fecha"),
-            # Usar get con valor por defecto para evitar TypeError en float(None)
-            "subtotal": float(root.get("SubTotal", 0)),
-            "total": float(root.get("Total", 0)),
-            "moneda": root.get("Moneda", "MXN"),
+            # `_f` devuelve 0.0 si el atributo no existe (evita float(None))
+            "subtotal": _f(root.get("SubTotal")),
+            "total": _f(root.get("Total")),
+            "moneda": _i(root.get("Moneda", "MXN")),
             "tipo_comprobante": self.traducir_tipo_comprobante(
                 root.get("TipoDeComprobante")
             ),
-            "metodo_pago": root.get("MetodoPago", "Pago parcial"),
-            "lugar_expedicion": root.get("LugarExpedicion", "SIN_LUGAR"),
+            "metodo_pago": _i(root.get("MetodoPago", "Pago parcial")),
+            "lugar_expedicion": _i(root.get("LugarExpedicion", "SIN_LUGAR")),
         }
         return datos
 
     def traducir_tipo_comprobante(self, tipo):
         """Mapea códigos de tipo de comprobante a descripciones legibles."""
-        tipos = {
-            "I": "Ingreso (Factura)",
-            "E": "Egreso (Nota de Crédito)",
-            "P": "Pago",
-            "N": "Nómina",
-            "T": "Traslado",
-        }
-        return tipos.get(tipo, f"Desconocido ({tipo})")
+        return _TIPOS.get(tipo, f"Desconocido ({tipo})")
 
     def extraer_emisor(self, root):
-        """Extrae información del emisor intentando en distintos namespaces."""
-        emisor = root.find("cfdi:Emisor", self.namespaces)
-        if emisor is None:
-            # Intentar con la etiqueta usada en CFDI 3.3
-            emisor = root.find("cfdi33:Emisor", self.namespaces)
+        """Extrae información del emisor según el namespace del comprobante."""
+        xp = self._xp_emisor33 if self._es_cfdi33(root) else self._xp_emisor
+        return self._datos_emisor(_primero(xp(root)))
 
+    def _datos_emisor(self, emisor):
+        """Convierte el nodo Emisor (o `None`) en el diccionario de salida."""
         if emisor is not None:
             return {
-                "rfc": emisor.get("Rfc"),
+                "rfc": _i(emisor.get("Rfc")),
                 "nombre": emisor.get("Nombre", "Sin Nombre"),
-                "regimen_fiscal": emisor.get("RegimenFiscal"),
+                "regimen_fiscal": _i(emisor.get("RegimenFiscal")),
             }
         # Devolver estructura consistente aunque falte el emisor
         return {"rfc": None, "nombre": None, "regimen_fiscal": None}
 
     def extraer_receptor(self, root):
-        """Extrae información del receptor (cliente) con fallback entre versiones."""
-        receptor = root.find("cfdi:Receptor", self.namespaces)
-        if receptor is None:
-            receptor = root.find("cfdi33:Receptor", self.namespaces)
+        """Extrae información del receptor (cliente) según la versión del CFDI."""
+        xp = self._xp_receptor33 if self._es_cfdi33(root) else self._xp_receptor
+        return self._datos_receptor(_primero(xp(root)))
 
+    def _datos_receptor(self, receptor):
+        """Convierte el nodo Receptor (o `None`) en el diccionario de salida."""
         if receptor is not None:
             return {
-                "rfc": receptor.get("Rfc"),
+                "rfc": _i(receptor.get("Rfc")),
                 "nombre": receptor.get("Nombre", "Sin Nombre"),
-                "uso_cfdi": receptor.get("UsoCFDI"),
-                "regimen_fiscal": receptor.get("RegimenFiscalReceptor"),
-                "domicilio_fiscal": receptor.get("DomicilioFiscalReceptor"),
-                "domicilio_fiscal_receptor": receptor.get("DomicilioFiscalReceptor"),
+                "uso_cfdi": _i(receptor.get("UsoCFDI")),
+                "regimen_fiscal": _i(receptor.get("RegimenFiscalReceptor")),
+                "domicilio_fiscal": _i(receptor.get("DomicilioFiscalReceptor")),
+                "domicilio_fiscal_receptor": _i(receptor.get("DomicilioFiscalReceptor")),
             }
         return {
             "rfc": None,
@@ -161,23 +309,27 @@ class CFDIExtractor:
 
         Devuelve una lista de diccionarios con información del concepto y sus impuestos.
         """
-        conceptos = root.findall("cfdi:Conceptos/cfdi:Concepto", self.namespaces)
-        if not conceptos:
-            conceptos = root.findall(
-                "cfdi33:Conceptos/cfdi33:Concepto", self.namespaces
-            )
+        xp = self._xp_conceptos33 if self._es_cfdi33(root) else self._xp_conceptos
+        return self._datos_conceptos(xp(root))
 
+    def _datos_conceptos(self, conceptos):
+        """Convierte una secuencia de nodos Concepto en la lista de salida."""
         lista_conceptos = []
         for concepto in conceptos:
+            get = concepto.get
+            cantidad, valor_unitario, importe, descuento = map(
+                _f,
+                (get("Cantidad"), get("ValorUnitario"), get("Importe"), get("Descuento")),
+            )
             concepto_data = {
-                "clave_prod_serv": concepto.get("ClaveProdServ"),
-                "cantidad": float(concepto.get("Cantidad", 0)),
-                "clave_unidad": concepto.get("ClaveUnidad"),
-                "descripcion": concepto.get("Descripcion"),
-                "valor_unitario": float(concepto.get("ValorUnitario", 0)),
-                "importe": float(concepto.get("Importe", 0)),
-                "descuento": float(concepto.get("Descuento", 0)),
-                "objeto_imp": concepto.get("ObjetoImp"),
+                "clave_prod_serv": _i(get("ClaveProdServ")),
+                "cantidad": cantidad,
+                "clave_unidad": _i(get("ClaveUnidad")),
+                "descripcion": get("Descripcion"),
+                "valor_unitario": valor_unitario,
+                "importe": importe,
+                "descuento": descuento,
+                "objeto_imp": _i(get("ObjetoImp")),
             }
 
             # Extraer impuestos asociados al concepto
@@ -187,40 +339,52 @@ class CFDIExtractor:
         return lista_conceptos
 
     def extraer_impuestos_concepto(self, concepto):
-        """Extrae traslados y retenciones definidos dentro de un concepto."""
-        impuestos = {"traslados": [], "retenciones": []}
-
-        # Buscar elementos de traslado dentro del concepto
-        traslados = concepto.findall(".//cfdi:Traslado", self.namespaces)
-        for traslado in traslados:
-            impuestos["traslados"].append(
-                {
-                    "base": float(traslado.get("Base", 0)),
-                    "impuesto": traslado.get("Impuesto"),
-                    "tipo_factor": traslado.get("TipoFactor"),
-                    "tasa_cuota": float(traslado.get("TasaOCuota", 0)),
-                    "importe": float(traslado.get("Importe", 0)),
-                }
-            )
+        """Extrae traslados y retenciones definidos dentro de un concepto.
 
-        # Buscar retenciones dentro del concepto
-        retenciones = concepto.findall(".//cfdi:Retencion", self.namespaces)
-        for retencion in retenciones:
-            impuestos["retenciones"].append(
-                {
-                    "base": float(retencion.get("Base", 0)),
-                    "impuesto": retencion.get("Impuesto"),
-                    "tipo_factor": retencion.get("TipoFactor"),
-                    "tasa_cuota": float(retencion.get("TasaOCuota", 0)),
-                    "importe": float(retencion.get("Importe", 0)),
-                }
-            )
+        Localiza el nodo `Impuestos` del concepto y recorre sus grupos en una
+        sola pasada, igual que con los impuestos del comprobante.
+        """
+        impuestos = next(concepto.iterchildren(*self._tags_impuestos), None)
+        return self._datos_impuestos_totales(impuestos)
+
+    def extraer_impuestos_totales(self, root):
+        """Extrae los traslados y retenciones totales del comprobante.
 
-        return impuestos
+        Sólo considera el nodo `Impuestos` hijo directo del comprobante, de modo
+        que los impuestos de cada concepto no se cuentan dos veces.
+        """
+        xp = self._xp_impuestos33 if self._es_cfdi33(root) else self._xp_impuestos
+        return self._datos_impuestos_totales(_primero(xp(root)))
+
+    def _datos_impuestos_totales(self, impuestos):
+        """Convierte un nodo Impuestos (o `None`) en un diccionario de traslados/retenciones."""
+        datos = {"traslados": [], "retenciones": []}
+        if impuestos is None:
+            return datos
+
+        # Hijos directos: Traslados/Traslado y Retenciones/Retencion
+        for grupo in impuestos:
+            clave = self._grupos_impuestos.get(grupo.tag)
+            if clave is not None:
+                datos[clave].extend(self._datos_impuesto(imp) for imp in grupo)
+        return datos
+
+    def _datos_impuesto(self, impuesto):
+        """Convierte un nodo Traslado o Retencion en un diccionario."""
+        return {
+            "base": _f(impuesto.get("Base")),
+            "impuesto": _i(impuesto.get("Impuesto")),
+            "tipo_factor": _i(impuesto.get("TipoFactor")),
+            "tasa_cuota": _f(impuesto.get("TasaOCuota")),
+            "importe": _f(impuesto.get("Importe")),
+        }
 
     def extraer_timbre(self, root):
         """Extrae la información del timbre fiscal digital si existe."""
-        timbre = root.find(".//tfd:TimbreFiscalDigital", self.namespaces)
+        return self._datos_timbre(_primero(self._xp_timbre(root)))
+
+    def _datos_timbre(self, timbre):
+        """Convierte el nodo TimbreFiscalDigital (o `None`) en un diccionario."""
         if timbre is not None:
             return {
                 "uuid": timbre.get("UUID"),
@@ -235,9 +399,9 @@ class CFDIExtractor:
         complementos = {}
 
         # Complemento de Pagos: soportar tanto pagos v2.0 como v1.0
-        pagos = root.find(".//pago20:Pagos", self.namespaces)
-        if not pagos:
-            pagos = root.find(".//pago10:Pagos", self.namespaces)
+        pagos = _primero(self._xp_pagos20(root))
+        if pagos is None:
+            pagos = _primero(self._xp_pagos10(root))
 
         if pagos is not None:
             complementos["pagos"] = self.extraer_complemento_pagos(pagos)
@@ -251,61 +415,59 @@ class CFDIExtractor:
         """Extrae la lista de pagos y los documentos relacionados por pago."""
         datos_pagos = []
 
+        # La versión del complemento se decide una vez por el tag de `Pagos`;
+        # Pago, DoctoRelacionado y TrasladoDR comparten ese mismo namespace
+        if pagos.tag.startswith(self._T["pago10"]):
+            xp_pago, xp_docto = self._xp_pago10, self._xp_docto10
+            xp_impuestos_dr, xp_traslado_dr = self._xp_impuestos_dr10, self._xp_traslado_dr10
+        else:
+            xp_pago, xp_docto = self._xp_pago20, self._xp_docto20
+            xp_impuestos_dr, xp_traslado_dr = self._xp_impuestos_dr20, self._xp_traslado_dr20
+
         # Buscar elementos Pago dentro del complemento
-        lista_pagos = pagos.findall(".//pago20:Pago", self.namespaces)
-        if not lista_pagos:
-            lista_pagos = pagos.findall(".//pago10:Pago", self.namespaces)
+        lista_pagos = xp_pago(pagos)
 
         for pago in lista_pagos:
+            get = pago.get
             pago_data = {
-                "fecha_pago": pago.get("FechaPago"),
-                "forma_pago": pago.get("FormaDePagoP"),
-                "moneda": pago.get("MonedaP"),
-                "monto": float(pago.get("Monto", 0)),
+                "fecha_pago": get("FechaPago"),
+                "forma_pago": _i(get("FormaDePagoP")),
+                "moneda": _i(get("MonedaP")),
+                "monto": _f(get("Monto")),
                 "documentos_relacionados": [],
             }
 
             # Documentos relacionados con este pago (DoctoRelacionado)
-            docs = pago.findall(".//pago20:DoctoRelacionado", self.namespaces)
-            if not docs:
-                docs = pago.findall(".//pago10:DoctoRelacionado", self.namespaces)
+            docs = xp_docto(pago)
 
             for doc in docs:
                 # Extraer información de impuestos trasladados (TrasladoDR)
                 traslados_dr = []
-                impuestos_dr = doc.find(".//pago20:ImpuestosDR", self.namespaces)
-                if impuestos_dr is None:
-                    impuestos_dr = doc.find(".//pago10:ImpuestosDR", self.namespaces)
+                impuestos_dr = _primero(xp_impuestos_dr(doc))
 
                 if impuestos_dr is not None:
-                    traslados = impuestos_dr.findall(
-                        ".//pago20:TrasladoDR", self.namespaces
-                    )
-                    if not traslados:
-                        traslados = impuestos_dr.findall(
-                            ".//pago10:TrasladoDR", self.namespaces
-                        )
-
-                    for traslado in traslados:
+                    for traslado in xp_traslado_dr(impuestos_dr):
+                        get = traslado.get
                         traslados_dr.append(
                             {
-                                "base": float(traslado.get("BaseDR", 0)),
-                                "impuesto": traslado.get("ImpuestoDR"),
-                                "tipo_factor": traslado.get("TipoFactorDR"),
-                                "tasa_cuota": float(traslado.get("TasaOCuotaDR", 0)),
-                                "importe": float(traslado.get("ImporteDR", 0)),
+                                "base": _f(get("BaseDR")),
+                                "impuesto": _i(get("ImpuestoDR")),
+                                "tipo_factor": _i(get("TipoFactorDR")),
+                                "tasa_cuota": _f(get("TasaOCuotaDR")),
+                                "importe": _f(get("ImporteDR")),
                             }
                         )
 
                 # Construir el diccionario del documento relacionado
+                get = doc.get
                 doc_relacionado = {
-                    "id_documento": doc.get("IdDocumento"),
-                    "serie": doc.get("Serie"),
-                    "folio": doc.get("Folio"),
-                    "moneda": doc.get("MonedaDR"),
-                    "imp_saldo_ant": float(doc.get("ImpSaldoAnt", 0)),
-                    "imp_pagado": float(doc.get("ImpPagado", 0)),
-                    "imp_saldo_insoluto": float(doc.get("ImpSaldoInsoluto", 0)),
+                    "id_documento": get("IdDocumento"),
+                    "serie": get("Serie"),
+                    "folio": get("Folio"),
+                    "moneda": _i(get("MonedaDR")),
+                    "imp_saldo_ant": _f(get("ImpSaldoAnt")),
+                    "imp_pagado": _f(get("ImpPagado")),
+                    "imp_saldo_insoluto": _f(get("ImpSaldoInsoluto")),
                     "traslados_dr": traslados_dr,
                 }
 
@@ -314,10 +476,46 @@ class CFDIExtractor:
 
         return datos_pagos
 
-    def procesar_cfdi_completo(self, archivo_path):
-        """Orquesta la extracción completa y devuelve un diccionario con resultados."""
-        print(f"Procesando: {archivo_path}")
-        print("=" * 50)
+    # Manejadores de la pasada única: cada uno recibe el nodo y el resultado
+    def _manejar_emisor(self, elem, resultado):
+        resultado["emisor"] = self._datos_emisor(elem)
+
+    def _manejar_receptor(self, elem, resultado):
+        resultado["receptor"] = self._datos_receptor(elem)
+
+    def _manejar_conceptos(self, elem, resultado):
+        # iterchildren filtra por tag Clark en C, sin comparar en Python
+        resultado["conceptos"] = self._datos_conceptos(
+            elem.iterchildren(*self._tags_concepto)
+        )
+
+    def _manejar_impuestos(self, elem, resultado):
+        resultado["impuestos"] = self._datos_impuestos_totales(elem)
+
+    def _manejar_complemento(self, elem, resultado):
+        manejadores = self._manejadores_complemento
+        for hijo in elem:
+            manejador = manejadores.get(hijo.tag)
+            if manejador is not None:
+                manejador(hijo, resultado)
+
+    def _manejar_timbre(self, elem, resultado):
+        resultado["timbre"] = self._datos_timbre(elem)
+
+    def _manejar_pagos(self, elem, resultado):
+        resultado["complementos"]["pagos"] = self.extraer_complemento_pagos(elem)
+
+    def procesar_cfdi_completo(self, archivo_path, fecha_lote=None):
+        """Orquesta la extracción completa y devuelve un diccionario con resultados.
+
+        Los hijos directos del comprobante se recorren una sola vez y cada uno
+        se despacha por su tag al manejador correspondiente, en lugar de
+        buscar cada sección por separado con varias consultas `.//`.
+
+        `fecha_lote` (ISO 8601) se usa como `fecha_procesamiento` cuando se
+        procesa un lote; si no se indica se toma la hora actual.
+        """
+        logger.debug("Procesando: %s", archivo_path)
 
         root = self.cargar_cfdi(archivo_path)
         if root is None:
@@ -325,39 +523,109 @@ class CFDIExtractor:
 
         resultado = {
             "archivo": archivo_path,
-            "fecha_procesamiento": datetime.now().isoformat(),
+            "fecha_procesamiento": fecha_lote or datetime.now().isoformat(),
             "datos_generales": self.extraer_datos_generales(root),
-            "emisor": self.extraer_emisor(root),
-            "receptor": self.extraer_receptor(root),
-            "conceptos": self.extraer_conceptos(root),
-            "timbre": self.extraer_timbre(root),
-            "complementos": self.extraer_complementos(root),
-            "impuestos": self.extraer_impuestos_concepto(root),
+            "emisor": self._datos_emisor(None),
+            "receptor": self._datos_receptor(None),
+            "conceptos": [],
+            "timbre": {},
+            "complementos": {},
+            "impuestos": self._datos_impuestos_totales(None),
         }
 
-        # Mostrar un resumen amigable en consola
-        self.mostrar_resumen(resultado)
+        manejadores = self._manejadores
+        for elem in root:
+            manejador = manejadores.get(elem.tag)
+            if manejador is not None:
+                manejador(elem, resultado)
+
+        # Resumen amigable sólo si el nivel DEBUG está activo
+        if logger.isEnabledFor(logging.DEBUG):
+            self.mostrar_resumen(resultado)
 
         return resultado
 
     def mostrar_resumen(self, datos):
-        """Imprime en consola un breve resumen de los datos extraídos."""
-        print(f"📊 RESUMEN DEL CFDI")
-        print(f"UUID: {datos['timbre'].get('uuid', 'No disponible')}")
-        print(f"Tipo: {datos['datos_generales']['tipo_comprobante']}")
-        print(
-            f"Serie-Folio: {datos['datos_generales']['serie']}-{datos['datos_generales']['folio']}"
-        )
-        print(
-            f"Total: ${datos['datos_generales']['total']:,.2f} {datos['datos_generales']['moneda']}"
-        )
-        print(f"Emisor: {datos['emisor']['nombre']} ({datos['emisor']['rfc']})")
-        print(
-            f"Receptor: {datos['receptor'].get('nombre', 'Sin nombre')} ({datos['receptor'].get('rfc')})"
+        """Registra (nivel DEBUG) un breve resumen de los datos extraídos."""
+        dg = datos["datos_generales"]
+        logger.debug("📊 RESUMEN DEL CFDI")
+        logger.debug("UUID: %s", datos["timbre"].get("uuid", "No disponible"))
+        logger.debug("Tipo: %s", dg["tipo_comprobante"])
+        logger.debug("Serie-Folio: %s-%s", dg["serie"], dg["folio"])
+        logger.debug("Total: $%s %s", f"{dg['total']:,.2f}", dg["moneda"])
+        logger.debug("Emisor: %s (%s)", datos["emisor"]["nombre"], datos["emisor"]["rfc"])
+        logger.debug(
+            "Receptor: %s (%s)",
+            datos["receptor"].get("nombre", "Sin nombre"),
+            datos["receptor"].get("rfc"),
         )
-        print(f"Conceptos: {len(datos['conceptos'])} artículos/servicios")
+        logger.debug("Conceptos: %d artículos/servicios", len(datos["conceptos"]))
 
         if datos["complementos"]:
-            print(f"Complementos: {', '.join(datos['complementos'].keys())}")
+            logger.debug("Complementos: %s", ", ".join(datos["complementos"].keys()))
+
+        logger.debug("✅ Procesamiento completado")
+
+
+# Extractor compartido por hilo: cada worker de un pool compila las rutas XPath
+# una sola vez y lo reutiliza para todos los archivos que procesa. Es local al
+# hilo porque un `XMLParser` de lxml no debe usarse desde varios hilos a la vez.
+_LOCAL = threading.local()
+
+
+def _obtener_extractor():
+    """Devuelve el `CFDIExtractor` del hilo actual, creándolo si hace falta."""
+    extractor = getattr(_LOCAL, "extractor", None)
+    if extractor is None:
+        extractor = _LOCAL.extractor = CFDIExtractor()
+    return extractor
+
 
-        print("✅ Procesamiento completado\n")
+def procesar_archivo(archivo_path, fecha_lote=None):
+    """Procesa un XML con el extractor del hilo actual.
+
+    Apta tanto para `ProcessPoolExecutor` (es picklable) como para
+    `ThreadPoolExecutor`.
+    """
+    return _obtener_extractor().procesar_cfdi_completo(archivo_path, fecha_lote)
+
+
+def enviar_en_ventana(ex, rutas, fecha_lote=None, ventana=64):
+    """Envía `procesar_archivo` al pool y entrega los futuros en orden.
+
+    Como mucho `ventana` archivos quedan enviados sin consumir: el siguiente
+    se envía sólo cuando quien itera toma el más antiguo. Así los resultados
+    ya terminados no se acumulan en memoria durante todo el lote, y cada
+    futuro se libera en cuanto se deja de referenciar.
+    """
+    pendientes = deque()
+    for ruta in rutas:
+        pendientes.append(ex.submit(procesar_archivo, ruta, fecha_lote))
+        if len(pendientes) >= ventana:
+            yield pendientes.popleft()
+    while pendientes:
+        yield pendientes.popleft()
+
+
+def precargar_archivos(rutas):
+    """Pide al sistema operativo que adelante la lectura de los XML.
+
+    Sólo es una sugerencia (`posix_fadvise` con `POSIX_FADV_WILLNEED`): el
+    kernel empieza a traer el contenido a la caché de páginas mientras los
+    workers aún no llegan a esos archivos. En sistemas sin `posix_fadvise`
+    (por ejemplo Windows) no hace nada. Los errores se ignoran porque el
+    parseo posterior reportará cualquier archivo inaccesible.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for ruta in rutas:
+        try:
+            fd = os.open(ruta, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
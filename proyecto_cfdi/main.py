@@ -3,17 +3,32 @@ main.py - Interfaz Gráfica para Procesador CFDI
 """
 
 import flet as ft
+import logging
 import os
+import sys
 import asyncio
 import subprocess
 import platform
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
-from cfdi_tool.extractor import CFDIExtractor
+from cfdi_tool.extractor import EXTENSIONES_XML, enviar_en_ventana
 
 try:
-    from cfdi_tool.excel_writer import exportar_a_excel
+    from cfdi_tool.excel_writer import PARQUET_DISPONIBLE, exportar_a_excel, exportar_a_parquet
 except ImportError:
     exportar_a_excel = None
+    exportar_a_parquet = None
+    PARQUET_DISPONIBLE = False
+
+
+logger = logging.getLogger(__name__)
+
+
+def _configurar_worker(nivel_log):
+    """Replica el nivel de logging del proceso principal en cada worker."""
+    logging.basicConfig(level=nivel_log)
 
 
 class CFDIProcessorApp:
@@ -24,7 +39,6 @@ class CFDIProcessorApp:
         
         self.carpeta_input: Optional[str] = None
         self.carpeta_output: Optional[str] = None
-        self.extractor = CFDIExtractor()
         
         self.txt_input = ft.TextField(
             label="Ruta de la carpeta con archivos XML",
@@ -40,6 +54,15 @@ class CFDIProcessorApp:
             expand=True
         )
         
+        # Parquet evita la escritura de Excel en lotes grandes
+        # Sin pyarrow la opción se muestra deshabilitada
+        self.chk_parquet = ft.Checkbox(
+            label="Exportar en formato Parquet (lotes grandes)"
+            if PARQUET_DISPONIBLE else "Exportar en formato Parquet (requiere pyarrow)",
+            value=False,
+            disabled=not PARQUET_DISPONIBLE,
+        )
+        
         self.btn_procesar = ft.Button(
             "🚀 Iniciar Procesamiento",
             on_click=self.process_files,
@@ -109,7 +132,11 @@ class CFDIProcessorApp:
                     spacing=10
                 ),
                 
-                ft.Divider(height=40),
+                ft.Divider(height=20),
+                
+                ft.Row([self.chk_parquet], alignment=ft.MainAxisAlignment.CENTER),
+                
+                ft.Divider(height=20),
                 
                 ft.Row([self.btn_procesar], alignment=ft.MainAxisAlignment.CENTER),
                 
@@ -141,7 +168,9 @@ class CFDIProcessorApp:
         
         if os.path.exists(ruta) and os.path.isdir(ruta):
             try:
-                archivos = [f for f in os.listdir(ruta) if f.lower().endswith('.xml')]
+                with os.scandir(ruta) as it:
+                    archivos = [entrada.name for entrada in it
+                                if entrada.name.endswith(EXTENSIONES_XML) and entrada.is_file()]
                 if archivos:
                     self.carpeta_input = ruta
                     e.control.error_text = None
@@ -260,56 +289,83 @@ class CFDIProcessorApp:
         self.page.update()
         
         try:
-            archivos_xml = [f for f in os.listdir(self.carpeta_input) 
-                           if f.lower().endswith('.xml')]
+            # scandir entrega nombre y ruta completa en una sola pasada
+            with os.scandir(self.carpeta_input) as it:
+                archivos_xml = [entrada for entrada in it
+                                if entrada.name.endswith(EXTENSIONES_XML) and entrada.is_file()]
             total_archivos = len(archivos_xml)
             
             if total_archivos == 0:
                 await self.show_error("No se encontraron archivos XML.")
                 return
 
-            todos_los_datos = []
+            usar_parquet = self.chk_parquet.value
+            if usar_parquet:
+                # Validar antes de enviar trabajo al pool, no al final del lote
+                if not PARQUET_DISPONIBLE:
+                    raise ImportError("Se requiere pyarrow para exportar a Parquet.")
+                nombre_salida = "cfdi_*.parquet"
+                exportar, destino = exportar_a_parquet, self.carpeta_output
+            else:
+                if exportar_a_excel is None:
+                    raise ImportError("No se pudo importar exportar_a_excel.")
+                nombre_salida = "reporte_cfdi.xlsx"
+                exportar, destino = exportar_a_excel, os.path.join(self.carpeta_output, nombre_salida)
+
+            procesados = 0
             errores = 0
-            
-            for i, nombre_archivo in enumerate(archivos_xml):
-                self.txt_status.value = f"Procesando: {nombre_archivo}\n({i+1} de {total_archivos})"
-                self.progress_bar.value = (i + 1) / total_archivos
-                self.page.update()
-                
-                ruta_completa = os.path.join(self.carpeta_input, nombre_archivo)
-                
-                try:
-                    datos_cfdi = await asyncio.to_thread(
-                        self.extractor.procesar_cfdi_completo, 
-                        ruta_completa
-                    )
+
+            def resultados(futuros):
+                """Entrega al exportador cada CFDI en orden, conforme termina su worker."""
+                nonlocal procesados, errores
+                for i, (entrada, futuro) in enumerate(zip(archivos_xml, futuros)):
+                    nombre_archivo = entrada.name
+                    try:
+                        datos_cfdi = futuro.result()
+                    except Exception as ex_archivo:
+                        # Errores no controlados por el extractor: con traza completa
+                        logger.exception("Error procesando %s: %s", nombre_archivo, ex_archivo)
+                        datos_cfdi = None
+                    
+                    # Refrescar la interfaz cada 16 archivos (y con el último)
+                    if (i + 1) % 16 == 0 or i + 1 == total_archivos:
+                        self.txt_status.value = f"Procesando: {nombre_archivo}\n({i+1} de {total_archivos})"
+                        self.progress_bar.value = (i + 1) / total_archivos
+                        self.page.update()
+                    
                     if datos_cfdi:
-                        todos_los_datos.append(datos_cfdi)
+                        procesados += 1
+                        yield datos_cfdi
                     else:
                         errores += 1
-                except Exception as ex:
-                    print(f"Error procesando {nombre_archivo}: {ex}")
-                    errores += 1
-                
-                await asyncio.sleep(0.01)
 
-            self.progress_bar.value = 1.0
-            self.txt_status.value = "Generando Excel..."
-            self.page.update()
-            
-            if not todos_los_datos:
+            # Cada XML es independiente: se reparten entre procesos para usar
+            # todos los núcleos, y sus resultados se escriben conforme llegan.
+            # La ventana de envío limita los resultados en memoria a unos
+            # cuantos por worker en lugar del lote completo.
+            workers = os.cpu_count() or 1
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_configurar_worker,
+                initargs=(logging.getLogger().level,),
+            ) as ex:
+                # Una sola marca de tiempo para todo el lote
+                fecha_lote = datetime.now().isoformat()
+                futuros = enviar_en_ventana(
+                    ex, (entrada.path for entrada in archivos_xml), fecha_lote,
+                    ventana=workers * 4,
+                )
+                escrito = await asyncio.to_thread(exportar, resultados(futuros), destino)
+
+            if not procesados:
                 await self.show_error("No se extrajeron datos válidos.")
                 return
 
-            nombre_excel = "reporte_cfdi.xlsx"
-            ruta_salida_excel = os.path.join(self.carpeta_output, nombre_excel)
-            
-            if exportar_a_excel is None:
-                raise ImportError("No se pudo importar exportar_a_excel.")
+            if not escrito:
+                await self.show_error("No se pudo escribir el archivo de salida.")
+                return
 
-            await asyncio.to_thread(exportar_a_excel, todos_los_datos, ruta_salida_excel)
-            
-            await self.show_success(len(todos_los_datos), errores, nombre_excel)
+            await self.show_success(procesados, errores, nombre_salida)
             
         except Exception as ex:
             await self.show_error(f"Error:\n{str(ex)}")
@@ -394,5 +450,9 @@ async def main(page: ft.Page):
     print("✅ Aplicación iniciada (Async)")
 
 if __name__ == "__main__":
+    # Necesario para que el ProcessPoolExecutor funcione en ejecutables congelados
+    multiprocessing.freeze_support()
+    # El detalle por archivo del extractor sólo se muestra con --debug
+    logging.basicConfig(level=logging.DEBUG if "--debug" in sys.argv else logging.INFO)
     print("🚀 Iniciando Procesador CFDI")
     ft.app(main)
\ No newline at end of file
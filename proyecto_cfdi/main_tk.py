@@ -3,22 +3,35 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import threading
+import time
+import queue
 import sys
 import subprocess
 import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
 from typing import Optional
 
+# Hasta este número de archivos se procesa con hilos: lxml libera el GIL al
+# parsear y se evita el arranque de procesos y el pickling de cada resultado
+UMBRAL_HILOS = 1000
+
 # --- Ventana de carga ---
-loading = tk.Tk()
-loading.title("Iniciando...")
-loading.geometry("300x100")
-loading.resizable(False, False)
-ttk.Label(loading, text="Cargando aplicación...", font=("Arial", 12)).pack(pady=20)
-loading.update()  # ¡Importante! Fuerza a que se muestre ahora
+# Sólo en el proceso principal: los workers del pool vuelven a importar este
+# módulo y no deben abrir ventanas.
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Necesario en el ejecutable de PyInstaller
+    loading = tk.Tk()
+    loading.title("Iniciando...")
+    loading.geometry("300x100")
+    loading.resizable(False, False)
+    ttk.Label(loading, text="Cargando aplicación...", font=("Arial", 12)).pack(pady=20)
+    loading.update()  # ¡Importante! Fuerza a que se muestre ahora
 
 # Importar lógica de negocio existente
 try:
-    from cfdi_tool.extractor import CFDIExtractor
+    from cfdi_tool.extractor import EXTENSIONES_XML, enviar_en_ventana
     from cfdi_tool.excel_writer import exportar_a_excel
 except ImportError as e:
     messagebox.showerror("Error de Importación", f"No se pudieron cargar los módulos del proyecto:\n{e}")
@@ -38,10 +51,16 @@ class CFDIApp(tk.Tk):
         self.status_msg = tk.StringVar(value="Listo para iniciar")
         self.is_processing = False
         self.process_finished = False # Nuevo flag
+        self._xml_entries = None # Resultado del último escaneo de la carpeta
         
-        self.extractor = CFDIExtractor()
+        # Mensajes y estado publicados por el hilo de procesamiento; la UI los
+        # aplica por lotes cada 50 ms en lugar de un `after` por mensaje
+        self._log_q = queue.Queue()
+        self._pending_status = None
+        self._status_lock = threading.Lock()
         
         self.create_widgets()
+        self.after(50, self._drain_ui)
         
     def create_widgets(self):
         # Estilos
@@ -107,10 +126,20 @@ class CFDIApp(tk.Tk):
             self.process_finished = False # Resetear estado
             self.check_ready()
             
+    def scan_xml_files(self, folder):
+        """Lista los XML de la carpeta con `os.scandir` (una sola lectura del directorio)."""
+        with os.scandir(folder) as it:
+            return [
+                e for e in it
+                if e.name.endswith(EXTENSIONES_XML) and e.is_file(follow_symlinks=False)
+            ]
+            
     def validate_input(self, folder):
+        self._xml_entries = None
         try:
-            files = [f for f in os.listdir(folder) if f.lower().endswith('.xml')]
-            count = len(files)
+            # El conteo y el procesamiento comparten el mismo escaneo
+            self._xml_entries = self.scan_xml_files(folder)
+            count = len(self._xml_entries)
             if count > 0:
                 self.lbl_input_info.config(text=f"✅ Se encontraron {count} archivos XML", foreground="green")
             else:
@@ -138,50 +167,81 @@ class CFDIApp(tk.Tk):
             input_dir = self.input_path.get()
             output_dir = self.output_path.get()
             
-            xml_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.xml')]
-            total = len(xml_files)
+            # Reutilizar el escaneo de `validate_input`; si falló, volver a leer
+            xml_entries = self._xml_entries
+            if xml_entries is None:
+                xml_entries = self.scan_xml_files(input_dir)
+            total = len(xml_entries)
             
             if total == 0:
                 self.final_update("Error: No hay XMLs", error=True)
                 return
             
-            todos_los_datos = []
+            procesados = 0
             errores = 0
             
-            for i, filename in enumerate(xml_files):
-                # Actualizar UI desde el hilo
-                msg = f"Procesando {i+1}/{total}: {filename}"
-                self.update_status(msg, (i / total) * 100)
-                self.log_message_thread(f"Leyendo: {filename}")
-                
-                try:
-                    full_path = os.path.join(input_dir, filename)
-                    data = self.extractor.procesar_cfdi_completo(full_path)
-                    if data:
-                        todos_los_datos.append(data)
-                        self.log_message_thread(f"   [OK] {filename}")
-                    else:
+            def resultados(futuros):
+                """Entrega al escritor cada CFDI en cuanto su futuro termina."""
+                nonlocal procesados, errores
+                ultima_ui = 0.0
+                for i, (entry, futuro) in enumerate(zip(xml_entries, futuros)):
+                    filename = entry.name
+                    try:
+                        data = futuro.result()
+                        if data:
+                            procesados += 1
+                            self.log_message_thread(f"   [OK] {filename}")
+                            yield data
+                        else:
+                            errores += 1
+                            self.log_message_thread(f"   [ERROR] No se extrajeron datos de {filename}")
+                    except Exception as e:
+                        print(f"Error en {filename}: {e}")
+                        self.log_message_thread(f"   [EXCEPCIÓN] {e} en {filename}")
                         errores += 1
-                        self.log_message_thread(f"   [ERROR] No se extrajeron datos de {filename}")
-                except Exception as e:
-                    print(f"Error en {filename}: {e}")
-                    self.log_message_thread(f"   [EXCEPCIÓN] {e} en {filename}")
-                    errores += 1
+                    
+                    # Actualizar UI desde el hilo, como mucho 20 veces por segundo
+                    # (el último archivo siempre se reporta)
+                    ahora = time.monotonic()
+                    if ahora - ultima_ui > 0.05 or i + 1 == total:
+                        ultima_ui = ahora
+                        msg = f"Procesado {i+1}/{total}: {filename}"
+                        self.update_status(msg, ((i + 1) / total) * 100)
             
-            self.update_status("Generando Excel...", 100)
+            output_file = os.path.join(output_dir, "reporte_cfdi.xlsx")
             self.log_message_thread("Generando archivo Excel...")
             
-            if not todos_los_datos:
+            # El parseo es CPU-bound: repartir los XML entre todos los núcleos.
+            # Los futuros se recorren en orden para conservar el de los archivos
+            # y capturar por separado la excepción de cada uno. El Excel se
+            # escribe mientras llegan los resultados; la ventana de envío
+            # limita los resultados en memoria a unos cuantos por worker.
+            if total <= UMBRAL_HILOS:
+                workers = min(32, (os.cpu_count() or 1) * 2)
+                pool = ThreadPoolExecutor(max_workers=workers)
+            else:
+                workers = os.cpu_count() or 1
+                pool = ProcessPoolExecutor(max_workers=workers)
+            with pool as ex:
+                # Una sola marca de tiempo para todo el lote
+                fecha_lote = datetime.now().isoformat()
+                futuros = enviar_en_ventana(
+                    ex, (e.path for e in xml_entries), fecha_lote, ventana=workers * 4
+                )
+                escrito = exportar_a_excel(resultados(futuros), output_file)
+            
+            if not procesados:
                 self.final_update("No se extrajeron datos válidos", error=True)
                 return
-                
-            output_file = os.path.join(output_dir, "reporte_cfdi.xlsx")
-            exportar_a_excel(todos_los_datos, output_file)
+
+            if not escrito:
+                self.final_update("No se pudo escribir el archivo Excel", error=True)
+                return
             
             self.log_message_thread(f"Excel guardado en: {output_file}")
-            self.log_message_thread(f"Resumen: Procesados={len(todos_los_datos)}, Errores={errores}")
+            self.log_message_thread(f"Resumen: Procesados={procesados}, Errores={errores}")
             
-            msg = f"¡Completado!\n\nProcesados: {len(todos_los_datos)}\nErrores: {errores}\n\nArchivo guardado en:\n{output_file}"
+            msg = f"¡Completado!\n\nProcesados: {procesados}\nErrores: {errores}\n\nArchivo guardado en:\n{output_file}"
             self.final_update(msg, success=True, file_path=output_file)
             
         except Exception as e:
@@ -189,10 +249,41 @@ class CFDIApp(tk.Tk):
             self.final_update(f"Error crítico: {e}", error=True)
             
     def update_status(self, message, progress_val):
-        self.after(0, lambda: self._update_ui_safe(message, progress_val))
+        # Sólo interesa el estado más reciente; el candado evita que se pierda
+        # si la UI lo está tomando justo en ese momento
+        with self._status_lock:
+            self._pending_status = (message, progress_val)
         
     def log_message_thread(self, message, clear=False):
-        self.after(0, lambda: self.log_message(message, clear))
+        self._log_q.put((message, clear))
+        
+    def _drain_ui(self):
+        self._flush_ui()
+        self.after(50, self._drain_ui)
+        
+    def _flush_ui(self, max_batch=200):
+        """Aplica en la UI los mensajes y el estado pendientes del hilo de trabajo."""
+        batch = []
+        clear = False
+        try:
+            while len(batch) < max_batch:
+                message, clear_msg = self._log_q.get_nowait()
+                if clear_msg:
+                    batch.clear()
+                    clear = True
+                batch.append(message)
+        except queue.Empty:
+            pass
+        
+        if batch:
+            # Una sola inserción y un solo `see` por lote
+            self.log_message("\n".join(batch), clear)
+            
+        # Tomar y vaciar el estado en un solo paso
+        with self._status_lock:
+            status, self._pending_status = self._pending_status, None
+        if status is not None:
+            self._update_ui_safe(*status)
 
     def log_message(self, message, clear=False):
         self.txt_log.config(state='normal')
@@ -210,6 +301,8 @@ class CFDIApp(tk.Tk):
         self.after(0, lambda: self._finish_process(message, error, success, file_path))
         
     def _finish_process(self, message, error, success, file_path):
+        # Aplicar lo pendiente antes de que el estado final lo sobrescriba
+        self._flush_ui()
         self.is_processing = False
         if success:
              self.process_finished = True # Dejamos el botón deshabilitado
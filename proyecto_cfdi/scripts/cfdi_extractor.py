@@ -7,13 +7,44 @@ Este archivo contiene un extractor simple y tolerante a variantes de
 namespaces y versiones (CFDI 3.3/4.0). Los métodos devuelven estructuras
 consistentes (diccionarios y listas) para consumo por otras partes del
 proyecto (por ejemplo, exportación a Excel).
+
+Usa `lxml` para el parseo. El namespace del comprobante se detecta una vez
+al cargarlo y las búsquedas se hacen con tags en notación Clark; las del
+timbre y de los complementos de pago se compilan una sola vez como objetos
+XPath. `procesar_cfdi_completo` recorre el archivo con `iterparse` sin
+construir el árbol completo.
 """
 
-import xml.etree.ElementTree as ET
-import os
+from lxml import etree as ET
+import re
+import sys
 from datetime import datetime
 
 
+# Namespace (URI) del elemento raíz en notación Clark: "{uri}Comprobante"
+_RE_NAMESPACE = re.compile(r'^\{([^}]+)\}')
+
+# Versión de CFDI que corresponde a cada namespace del comprobante
+_VERSIONES = {
+    'http://www.sat.gob.mx/cfd/4': '4.0',
+    'http://www.sat.gob.mx/cfd/3': '3.3',
+}
+
+
+def _f(valor):
+    """Convierte un atributo numérico a float; si falta devuelve 0.0.
+
+    Comprobar `None` es más barato que pasar un default '0' que luego habría
+    que convertir de texto a número.
+    """
+    return float(valor) if valor is not None else 0.0
+
+
+def _i(valor):
+    """Internaliza códigos cortos que se repiten entre comprobantes."""
+    return sys.intern(valor) if valor is not None else None
+
+
 class CFDIExtractor:
     """Extractor para archivos CFDI.
 
@@ -21,9 +52,13 @@ class CFDIExtractor:
     - Intenta manejar distintas versiones y namespaces.
     - Todos los métodos devuelven estructuras consistentes aunque falten
       algunos atributos en el XML (evita lanzar excepciones inesperadas).
+    - Con `verbose=False` (por defecto) no imprime mensajes por archivo; sólo
+      se reportan los errores.
     """
 
-    def __init__(self):
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+
         # Namespaces habituales que puede contener un CFDI o sus complementos
         self.namespaces = {
             'cfdi': 'http://www.sat.gob.mx/cfd/4',
@@ -35,22 +70,73 @@ class CFDIExtractor:
             'cartaporte31': 'http://www.sat.gob.mx/CartaPorte31'
         }
 
+        # Parser reutilizable; collect_ids=False evita construir la tabla de IDs
+        # y sin expansión de entidades ni acceso a red (un CFDI no los necesita)
+        self._parser = ET.XMLParser(huge_tree=False, remove_blank_text=True, collect_ids=False,
+                                    resolve_entities=False, no_network=True)
+
+        # XPath compiladas una vez y reutilizadas en cada timbre/pago
+        def xp(ruta):
+            return ET.XPath(ruta, namespaces=self.namespaces)
+
+        self._xp_timbre = xp('.//tfd:TimbreFiscalDigital')
+        self._xp_pagos = xp('.//pago20:Pagos | .//pago10:Pagos')
+        self._xp_pago = xp('.//pago20:Pago | .//pago10:Pago')
+        self._xp_docto = xp('.//pago20:DoctoRelacionado | .//pago10:DoctoRelacionado')
+
+        # Tags del comprobante en notación Clark; `cargar_cfdi` los ajusta al
+        # namespace real del archivo (4.0 por defecto)
+        self._resolver_tags(self.namespaces['cfdi'])
+
+        # Elementos que `procesar_cfdi_completo` materializa con iterparse; el
+        # resto del documento se descarta conforme avanza el recorrido
+        self._tags_comprobante = set()
+        self._manejadores = {}
+        for prefijo in ('cfdi', 'cfdi33'):
+            uri = self.namespaces[prefijo]
+            self._tags_comprobante.add(f'{{{uri}}}Comprobante')
+            self._manejadores[f'{{{uri}}}Emisor'] = self._manejar_emisor
+            self._manejadores[f'{{{uri}}}Receptor'] = self._manejar_receptor
+            self._manejadores[f'{{{uri}}}Concepto'] = self._manejar_concepto
+        self._manejadores[f"{{{self.namespaces['tfd']}}}TimbreFiscalDigital"] = self._manejar_timbre
+        for prefijo in ('pago20', 'pago10'):
+            self._manejadores[f'{{{self.namespaces[prefijo]}}}Pagos'] = self._manejar_pagos
+        self._tags_iterparse = tuple(self._tags_comprobante) + tuple(self._manejadores)
+
+    def _resolver_tags(self, uri):
+        """Precalcula los tags Clark del namespace `uri` para búsquedas directas."""
+        self._ns = uri
+        self._version = _VERSIONES.get(uri, 'Desconocida')
+        self._tag_emisor = f'{{{uri}}}Emisor'
+        self._tag_receptor = f'{{{uri}}}Receptor'
+        self._tag_conceptos = f'{{{uri}}}Conceptos'
+        self._tag_concepto = f'{{{uri}}}Concepto'
+        self._tag_traslado = f'{{{uri}}}Traslado'
+        self._tag_retencion = f'{{{uri}}}Retencion'
+
     def cargar_cfdi(self, archivo_path):
         """Carga un archivo XML y retorna el elemento raíz (or None).
 
         Validaciones realizadas:
-        - existencia del archivo
+        - lectura del archivo (el parser falla con la ruta si no existe)
         - parseo válido del XML
         """
         try:
-            if not os.path.exists(archivo_path):
-                raise FileNotFoundError(f"No se encontró el archivo: {archivo_path}")
-
-            tree = ET.parse(archivo_path)
+            tree = ET.parse(archivo_path, parser=self._parser)
             root = tree.getroot()
 
-            version = self.detectar_version(root)
-            print(f"📄 CFDI Versión {version} cargado correctamente")
+            # Detectar el namespace una sola vez (4.0 o 3.3) desde el tag raíz
+            coincidencia = _RE_NAMESPACE.match(root.tag)
+            if coincidencia and coincidencia.group(1) != self._ns:
+                self._resolver_tags(coincidencia.group(1))
+
+            if self.verbose:
+                # El atributo Version manda; si falta, basta el namespace ya resuelto
+                if coincidencia:
+                    version = root.get('Version') or self._version
+                else:
+                    version = self.detectar_version(root)
+                print(f"📄 CFDI Versión {version} cargado correctamente")
 
             return root
 
@@ -87,12 +173,12 @@ class CFDIExtractor:
             'serie': root.get('Serie', 'Sin Serie'),
             'folio': root.get('Folio', 'Sin Folio'),
             'fecha': root.get('Fecha'),
-            'subtotal': float(root.get('SubTotal', 0)),
-            'total': float(root.get('Total', 0)),
-            'moneda': root.get('Moneda', 'MXN'),
+            'subtotal': _f(root.get('SubTotal')),
+            'total': _f(root.get('Total')),
+            'moneda': _i(root.get('Moneda', 'MXN')),
             'tipo_comprobante': self.traducir_tipo_comprobante(root.get('TipoDeComprobante')),
-            'metodo_pago': root.get('MetodoPago', 'No especificado'),
-            'lugar_expedicion': root.get('LugarExpedicion')
+            'metodo_pago': _i(root.get('MetodoPago', 'No especificado')),
+            'lugar_expedicion': _i(root.get('LugarExpedicion'))
         }
         return datos
 
@@ -108,11 +194,11 @@ class CFDIExtractor:
         return tipos.get(tipo, f'Desconocido ({tipo})')
 
     def extraer_emisor(self, root):
-        """Localiza el elemento Emisor en distintos namespaces y devuelve datos."""
-        emisor = root.find('cfdi:Emisor', self.namespaces)
-        if emisor is None:
-            emisor = root.find('cfdi33:Emisor', self.namespaces)
+        """Localiza el elemento Emisor en el namespace del comprobante y devuelve datos."""
+        return self._datos_emisor(root.find(self._tag_emisor))
 
+    def _datos_emisor(self, emisor):
+        """Convierte el elemento Emisor (o None) en un diccionario."""
         if emisor is None:
             return {'rfc': None, 'nombre': None, 'regimen_fiscal': None}
 
@@ -123,11 +209,11 @@ class CFDIExtractor:
         }
 
     def extraer_receptor(self, root):
-        """Extrae información del receptor (cliente) con fallbacks de versión."""
-        receptor = root.find('cfdi:Receptor', self.namespaces)
-        if receptor is None:
-            receptor = root.find('cfdi33:Receptor', self.namespaces)
+        """Extrae información del receptor (cliente) del namespace detectado."""
+        return self._datos_receptor(root.find(self._tag_receptor))
 
+    def _datos_receptor(self, receptor):
+        """Convierte el elemento Receptor (o None) en un diccionario."""
         if receptor is None:
             return {}
 
@@ -141,56 +227,56 @@ class CFDIExtractor:
 
     def extraer_conceptos(self, root):
         """Recupera todos los conceptos y normaliza tipos numéricos."""
-        conceptos = root.findall('cfdi:Conceptos/cfdi:Concepto', self.namespaces)
-        if not conceptos:
-            conceptos = root.findall('cfdi33:Conceptos/cfdi33:Concepto', self.namespaces)
-
-        lista = []
-        for concepto in conceptos:
-            c = {
-                'clave_prod_serv': concepto.get('ClaveProdServ'),
-                'cantidad': float(concepto.get('Cantidad', 0)),
-                'clave_unidad': concepto.get('ClaveUnidad'),
-                'descripcion': concepto.get('Descripcion'),
-                'valor_unitario': float(concepto.get('ValorUnitario', 0)),
-                'importe': float(concepto.get('Importe', 0)),
-                'descuento': float(concepto.get('Descuento', 0)),
-                'objeto_imp': concepto.get('ObjetoImp')
-            }
-            c['impuestos'] = self.extraer_impuestos_concepto(concepto)
-            lista.append(c)
-
-        return lista
+        # Búsqueda por tag precalculado: sin armar ni interpretar una ruta
+        conceptos = root.find(self._tag_conceptos)
+        if conceptos is None:
+            return []
+        return [
+            self._datos_concepto(concepto)
+            for concepto in conceptos.iterchildren(self._tag_concepto)
+        ]
+
+    def _datos_concepto(self, concepto):
+        """Convierte un elemento Concepto (con sus impuestos) en un diccionario."""
+        get = concepto.get
+        c = {
+            'clave_prod_serv': get('ClaveProdServ'),
+            'cantidad': _f(get('Cantidad')),
+            'clave_unidad': _i(get('ClaveUnidad')),
+            'descripcion': get('Descripcion'),
+            'valor_unitario': _f(get('ValorUnitario')),
+            'importe': _f(get('Importe')),
+            'descuento': _f(get('Descuento')),
+            'objeto_imp': get('ObjetoImp')
+        }
+        c['impuestos'] = self.extraer_impuestos_concepto(concepto)
+        return c
 
     def extraer_impuestos_concepto(self, concepto):
         """Extrae traslados y retenciones dentro de un elemento Concepto."""
         impuestos = {'traslados': [], 'retenciones': []}
-
-        traslados = concepto.findall('.//cfdi:Traslado', self.namespaces)
-        for t in traslados:
-            impuestos['traslados'].append({
-                'base': float(t.get('Base', 0)),
-                'impuesto': t.get('Impuesto'),
-                'tipo_factor': t.get('TipoFactor'),
-                'tasa_cuota': float(t.get('TasaOCuota', 0)),
-                'importe': float(t.get('Importe', 0))
-            })
-
-        retenciones = concepto.findall('.//cfdi:Retencion', self.namespaces)
-        for r in retenciones:
-            impuestos['retenciones'].append({
-                'base': float(r.get('Base', 0)),
-                'impuesto': r.get('Impuesto'),
-                'tipo_factor': r.get('TipoFactor'),
-                'tasa_cuota': float(r.get('TasaOCuota', 0)),
-                'importe': float(r.get('Importe', 0))
+        tag_traslado = self._tag_traslado
+
+        # Un solo recorrido del subárbol; lxml filtra ambos tags en C
+        for el in concepto.iter(tag_traslado, self._tag_retencion):
+            get = el.get
+            destino = impuestos['traslados'] if el.tag == tag_traslado else impuestos['retenciones']
+            destino.append({
+                'base': _f(get('Base')),
+                'impuesto': _i(get('Impuesto')),
+                'tipo_factor': _i(get('TipoFactor')),
+                'tasa_cuota': _f(get('TasaOCuota')),
+                'importe': _f(get('Importe'))
             })
 
         return impuestos
 
     def extraer_timbre(self, root):
         """Extrae datos del Timbrado Fiscal Digital si está presente."""
-        timbre = root.find('.//tfd:TimbreFiscalDigital', self.namespaces)
+        return self._datos_timbre(next(iter(self._xp_timbre(root)), None))
+
+    def _datos_timbre(self, timbre):
+        """Convierte el elemento TimbreFiscalDigital (o None) en un diccionario."""
         if timbre is None:
             return {}
 
@@ -205,73 +291,129 @@ class CFDIExtractor:
         """Detecta y extrae complementos (p.ej. pagos) presentes en el CFDI."""
         complementos = {}
 
-        pagos = root.find('.//pago20:Pagos', self.namespaces)
-        if pagos is None:
-            pagos = root.find('.//pago10:Pagos', self.namespaces)
-
-        if pagos is not None:
-            complementos['pagos'] = self.extraer_complemento_pagos(pagos)
+        pagos = self._xp_pagos(root)
+        if pagos:
+            complementos['pagos'] = self.extraer_complemento_pagos(pagos[0])
 
         # Se pueden añadir más complementos aquí (nómina, carta porte, etc.)
         return complementos
 
     def extraer_complemento_pagos(self, pagos):
         """Extrae la estructura de Pagos y sus documentos relacionados."""
-        lista_pagos = pagos.findall('.//pago20:Pago', self.namespaces)
-        if not lista_pagos:
-            lista_pagos = pagos.findall('.//pago10:Pago', self.namespaces)
-
         resultados = []
-        for pago in lista_pagos:
+        for pago in self._xp_pago(pagos):
+            get = pago.get
             pago_data = {
-                'fecha_pago': pago.get('FechaPago'),
-                'forma_pago': pago.get('FormaDePagoP'),
-                'moneda': pago.get('MonedaP'),
-                'monto': float(pago.get('Monto', 0)),
+                'fecha_pago': get('FechaPago'),
+                'forma_pago': _i(get('FormaDePagoP')),
+                'moneda': _i(get('MonedaP')),
+                'monto': _f(get('Monto')),
                 'documentos_relacionados': []
             }
 
-            docs = pago.findall('.//pago20:DoctoRelacionado', self.namespaces)
-            if not docs:
-                docs = pago.findall('.//pago10:DoctoRelacionado', self.namespaces)
-
-            for doc in docs:
+            for doc in self._xp_docto(pago):
+                get = doc.get
                 pago_data['documentos_relacionados'].append({
-                    'id_documento': doc.get('IdDocumento'),
-                    'serie': doc.get('Serie'),
-                    'folio': doc.get('Folio'),
-                    'moneda': doc.get('MonedaDR'),
-                    'imp_saldo_ant': float(doc.get('ImpSaldoAnt', 0)),
-                    'imp_pagado': float(doc.get('ImpPagado', 0)),
-                    'imp_saldo_insoluto': float(doc.get('ImpSaldoInsoluto', 0))
+                    'id_documento': get('IdDocumento'),
+                    'serie': get('Serie'),
+                    'folio': get('Folio'),
+                    'moneda': _i(get('MonedaDR')),
+                    'imp_saldo_ant': _f(get('ImpSaldoAnt')),
+                    'imp_pagado': _f(get('ImpPagado')),
+                    'imp_saldo_insoluto': _f(get('ImpSaldoInsoluto'))
                 })
 
             resultados.append(pago_data)
 
         return resultados
 
+    # Manejadores del recorrido con iterparse: reciben el elemento ya completo
+    def _manejar_emisor(self, elem, resultado):
+        resultado['emisor'] = self._datos_emisor(elem)
+
+    def _manejar_receptor(self, elem, resultado):
+        resultado['receptor'] = self._datos_receptor(elem)
+
+    def _manejar_concepto(self, elem, resultado):
+        resultado['conceptos'].append(self._datos_concepto(elem))
+
+    def _manejar_timbre(self, elem, resultado):
+        # Igual que `extraer_timbre`: sólo cuenta el primer timbre
+        if not resultado['timbre']:
+            resultado['timbre'] = self._datos_timbre(elem)
+
+    def _manejar_pagos(self, elem, resultado):
+        if 'pagos' not in resultado['complementos']:
+            resultado['complementos']['pagos'] = self.extraer_complemento_pagos(elem)
+
     def procesar_cfdi_completo(self, archivo_path):
-        """Orquesta la extracción completa y devuelve un diccionario con los datos."""
-        print(f"🔍 Procesando: {archivo_path}")
-        print("=" * 50)
+        """Orquesta la extracción completa y devuelve un diccionario con los datos.
 
-        root = self.cargar_cfdi(archivo_path)
-        if root is None:
-            return None
+        Recorre el archivo una sola vez con `iterparse`, materializando sólo
+        los elementos de interés. Cada uno se limpia en cuanto se procesa y
+        sus hermanos anteriores se eliminan, de modo que el árbol completo
+        nunca llega a estar en memoria.
+        """
+        if self.verbose:
+            print(f"🔍 Procesando: {archivo_path}")
+            print("=" * 50)
 
         resultado = {
             'archivo': archivo_path,
             'fecha_procesamiento': datetime.now().isoformat(),
-            'datos_generales': self.extraer_datos_generales(root),
-            'emisor': self.extraer_emisor(root),
-            'receptor': self.extraer_receptor(root),
-            'conceptos': self.extraer_conceptos(root),
-            'timbre': self.extraer_timbre(root),
-            'complementos': self.extraer_complementos(root)
+            'datos_generales': None,
+            'emisor': self._datos_emisor(None),
+            'receptor': self._datos_receptor(None),
+            'conceptos': [],
+            'timbre': {},
+            'complementos': {}
         }
 
-        # Resumen para el operador
-        self.mostrar_resumen(resultado)
+        try:
+            eventos = ET.iterparse(
+                archivo_path,
+                events=('start', 'end'),
+                tag=self._tags_iterparse,
+                remove_blank_text=True,
+                collect_ids=False,
+                resolve_entities=False,
+                no_network=True,
+            )
+            manejadores = self._manejadores
+            for evento, elem in eventos:
+                if evento == 'start':
+                    # Los atributos del comprobante ya están disponibles al abrirlo
+                    if elem.tag in self._tags_comprobante:
+                        coincidencia = _RE_NAMESPACE.match(elem.tag)
+                        if coincidencia.group(1) != self._ns:
+                            self._resolver_tags(coincidencia.group(1))
+                        if self.verbose:
+                            version = elem.get('Version') or self._version
+                            print(f"📄 CFDI Versión {version} cargado correctamente")
+                        resultado['datos_generales'] = self.extraer_datos_generales(elem)
+                    continue
+
+                manejador = manejadores.get(elem.tag)
+                if manejador is None:
+                    continue
+                manejador(elem, resultado)
+
+                # Liberar el elemento y los hermanos anteriores ya procesados
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+        except ET.ParseError as e:
+            print(f"❌ Error al parsear XML: {e}")
+            return None
+        except Exception as e:
+            print(f"❌ Error inesperado: {e}")
+            return None
+
+        if resultado['datos_generales'] is None:
+            print("❌ El archivo no contiene un nodo Comprobante de CFDI")
+            return None
+
         return resultado
 
     def mostrar_resumen(self, datos):
@@ -291,7 +433,9 @@ class CFDIExtractor:
 
 # Ejemplo de uso local (se ejecuta sólo si el archivo se corre directamente)
 if __name__ == '__main__':
-    extractor = CFDIExtractor()
+    extractor = CFDIExtractor(verbose=True)
     resultado = extractor.procesar_cfdi_completo('1a3e0f9a-ec50-4020-bf93-33f613599acb.xml')
     if resultado:
+        # Resumen para el operador
+        extractor.mostrar_resumen(resultado)
         print('🎉 Extracción de ejemplo completada')
\ No newline at end of file
@@ -11,7 +11,7 @@ Buenas prácticas aplicadas:
 - Comentarios claros antes de bloques lógicos
 """
 
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
 import os
 
 
@@ -8,12 +8,25 @@ primeras líneas (con manejo de codificaciones), inspección de los primeros
 bytes para detectar la declaración XML y caracteres problemáticos.
 """
 
+import contextlib
+import io
+import itertools
 import os
+import sys
+
+# Todas las combinaciones de mayúsculas/minúsculas de ".xml" (como en
+# `cfdi_tool.extractor`; el script se mantiene independiente del paquete)
+EXTENSIONES_XML = tuple(
+    "." + "".join(letras) for letras in itertools.product("xX", "mM", "lL")
+)
 
 
 def diagnosticar_archivo_xml(archivo_path):
     """Diagnostica problemas comunes en un archivo XML o CFDI.
 
+    El reporte se arma en memoria y se escribe a la salida estándar de una
+    sola vez, en lugar de hacer una escritura por cada línea.
+
     Parámetros:
     - archivo_path (str): Ruta al archivo XML a diagnosticar.
 
@@ -21,6 +34,17 @@ def diagnosticar_archivo_xml(archivo_path):
     - bool: True si el diagnóstico no detectó fallos críticos de lectura,
       False si detectó un problema que impide procesar el archivo.
     """
+    reporte = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(reporte):
+            return _diagnosticar(archivo_path)
+    finally:
+        # Escribir lo acumulado aunque el diagnóstico termine antes o falle
+        sys.stdout.write(reporte.getvalue())
+
+
+def _diagnosticar(archivo_path):
+    """Cuerpo de `diagnosticar_archivo_xml`; imprime cada línea del reporte."""
 
     print(f"🔍 DIAGNÓSTICO DE: {archivo_path}")
     print("=" * 50)
@@ -42,52 +66,48 @@ def diagnosticar_archivo_xml(archivo_path):
         print("❌ ERROR: El archivo está vacío")
         return False
 
-    # 3) Mostrar las primeras líneas para inspección visual
+    # 3) Abrir una sola vez en binario: los primeros 100 bytes para el
+    # análisis y, desde el inicio, sólo las primeras 10 líneas
+    try:
+        with open(archivo_path, 'rb') as file:
+            primeros_bytes = file.read(100)
+            file.seek(0)
+            lineas = list(itertools.islice(file, 10))
+    except OSError as e:
+        print(f"❌ No se puede leer el archivo: {e}")
+        return False
+
+    # Mostrar las primeras líneas para inspección visual
     print("\n📖 PRIMERAS 10 LÍNEAS DEL ARCHIVO:")
     print("-" * 40)
 
-    # Intentar leer con UTF-8 y, en caso de error, reintentar con Latin-1
-    try:
-        with open(archivo_path, 'r', encoding='utf-8') as file:
-            for i, linea in enumerate(file, 1):
-                if i <= 10:
-                    # Usamos repr() para hacer visibles caracteres especiales
-                    linea_limpia = repr(linea.rstrip())
-                    print(f"{i:2}: {linea_limpia}")
-                else:
-                    break
-    except UnicodeDecodeError:
-        print("⚠️  Problema de codificación UTF-8, intentando con Latin-1...")
+    # Decodificar cada línea con UTF-8 y, si falla, con Latin-1
+    aviso_latin1 = False
+    for i, linea in enumerate(lineas, 1):
         try:
-            with open(archivo_path, 'r', encoding='latin-1') as file:
-                for i, linea in enumerate(file, 1):
-                    if i <= 10:
-                        linea_limpia = repr(linea.rstrip())
-                        print(f"{i:2}: {linea_limpia}")
-                    else:
-                        break
-        except Exception as e:
-            # Si aún no se puede leer, mostrar error y abortar diagnóstico
-            print(f"❌ No se puede leer el archivo: {e}")
-            return False
+            texto = linea.decode('utf-8')
+        except UnicodeDecodeError:
+            if not aviso_latin1:
+                print("⚠️  Problema de codificación UTF-8, usando Latin-1...")
+                aviso_latin1 = True
+            texto = linea.decode('latin-1')
+        # Usamos repr() para hacer visibles caracteres especiales
+        print(f"{i:2}: {repr(texto.rstrip())}")
 
     # 4) Revisar los primeros bytes para detectar declaración XML y posibles binarios
     print("\n🔍 ANÁLISIS:")
-    with open(archivo_path, 'rb') as file:
-        primeros_bytes = file.read(100)
 
     # Mostrar un resumen hex y texto (ignorando errores de decodificación)
     print(f"Primeros bytes (hex): {primeros_bytes[:20].hex()}")
     print(f"Primeros caracteres: {repr(primeros_bytes[:50].decode('utf-8', errors='ignore'))}")
 
-    # 5) Verificaciones específicas: declaración XML y formato
-    contenido_inicio = primeros_bytes.decode('utf-8', errors='ignore')
-
-    if not contenido_inicio.strip().startswith('<?xml'):
+    # 5) Verificaciones específicas: declaración XML y formato. Se comparan
+    # los bytes directamente; no hace falta decodificarlos para esto
+    if not primeros_bytes.lstrip().startswith(b'<?xml'):
         print("❌ ERROR: El archivo no comienza con '<?xml'")
         print("💡 Este podría ser el problema principal")
 
-        if contenido_inicio.startswith('<'):
+        if primeros_bytes.startswith(b'<'):
             # Posible XML válido pero sin declaración de encabezado
             print("   - El archivo parece ser XML pero sin declaración")
             print("   - Intenta agregar '<?xml version=\"1.0\" encoding=\"UTF-8\"?>' al inicio")
@@ -127,13 +147,15 @@ if __name__ == "__main__":
     print("🏥 DIAGNÓSTICO XML - Detector de Problemas")
     print("=" * 50)
     
-    # Listar archivos XML en la carpeta actual
-    archivos_xml = [f for f in os.listdir('.') if f.lower().endswith('.xml')]
+    # Listar archivos XML en la carpeta actual: scandir entrega nombre y
+    # tamaño en la misma pasada, sin un getsize por archivo
+    with os.scandir('.') as it:
+        archivos_xml = [(entrada.name, entrada.stat().st_size) for entrada in it
+                        if entrada.name.endswith(EXTENSIONES_XML) and entrada.is_file()]
     
     if archivos_xml:
         print("📁 Archivos XML encontrados en esta carpeta:")
-        for archivo in archivos_xml:
-            tamaño = os.path.getsize(archivo)
+        for archivo, tamaño in archivos_xml:
             print(f"   - {archivo} ({tamaño:,} bytes)")
         print()
     else:
@@ -148,7 +170,7 @@ if __name__ == "__main__":
         
         # Ofrecer diagnóstico de cualquier XML que encuentre
         if archivos_xml:
-            print(f"\n¿Quieres que diagnostique '{archivos_xml[0]}'? (s/n)")
+            print(f"\n¿Quieres que diagnostique '{archivos_xml[0][0]}'? (s/n)")
             # En un script real podrías pedir input del usuario
             
     print("\n" + "=" * 50)
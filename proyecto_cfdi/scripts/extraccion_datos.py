@@ -2,7 +2,7 @@
 extraccion_datos.py
 
 Script de ejemplo para extraer información básica de un CFDI (XML) usando
-xml.etree.ElementTree. El objetivo es mostrar cómo navegar el árbol XML,
+lxml.etree. El objetivo es mostrar cómo recorrer el XML con `iterparse`,
 usar namespaces y obtener atributos relevantes (serie, folio, emisor, conceptos,
 UUID del timbre, complementos de pago, etc.).
 
@@ -12,7 +12,7 @@ Buenas prácticas aplicadas:
 - Manejo explícito de excepciones comunes
 """
 
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
 
 # Namespaces necesarios para buscar elementos en un CFDI 4.0
 namespaces = {
@@ -21,11 +21,55 @@ namespaces = {
     'pago20': 'http://www.sat.gob.mx/Pagos20'
 }
 
+# Tags (notación Clark) de los únicos elementos que el script necesita
+TAG_EMISOR = f"{{{namespaces['cfdi']}}}Emisor"
+TAG_RECEPTOR = f"{{{namespaces['cfdi']}}}Receptor"
+TAG_CONCEPTO = f"{{{namespaces['cfdi']}}}Concepto"
+TAG_TIMBRE = f"{{{namespaces['tfd']}}}TimbreFiscalDigital"
+TAG_PAGOS = f"{{{namespaces['pago20']}}}Pagos"
+TAG_PAGO = f"{{{namespaces['pago20']}}}Pago"
+
 
 # Intentar cargar y procesar el XML de ejemplo
 try:
-    tree = ET.parse('ejemplo_xml_cfdi.xml')
-    root = tree.getroot()
+    # Un solo recorrido con iterparse: sólo se materializan los elementos de
+    # interés y cada uno se libera en cuanto se copian sus atributos.
+    # Se abre con open() para que un archivo faltante lance FileNotFoundError.
+    emisor = receptor = timbre = pago_detalle = None
+    conceptos = []
+    tiene_pagos = False
+
+    with open('ejemplo_xml_cfdi.xml', 'rb') as archivo:
+        eventos = ET.iterparse(
+            archivo,
+            tag=(TAG_EMISOR, TAG_RECEPTOR, TAG_CONCEPTO,
+                 TAG_TIMBRE, TAG_PAGOS, TAG_PAGO),
+        )
+        for _, elem in eventos:
+            tag = elem.tag
+            if tag == TAG_CONCEPTO:
+                # Tomar attrib una sola vez y copiar sólo los cuatro campos usados
+                a = elem.attrib
+                conceptos.append((a.get('Descripcion'), a.get('Cantidad'),
+                                  a.get('ValorUnitario'), a.get('Importe')))
+            elif tag == TAG_EMISOR and emisor is None:
+                emisor = dict(elem.attrib)
+            elif tag == TAG_RECEPTOR and receptor is None:
+                receptor = dict(elem.attrib)
+            elif tag == TAG_TIMBRE and timbre is None:
+                timbre = dict(elem.attrib)
+            elif tag == TAG_PAGO and pago_detalle is None:
+                pago_detalle = dict(elem.attrib)
+            elif tag == TAG_PAGOS:
+                tiene_pagos = True
+
+            # Liberar el elemento y los hermanos anteriores ya procesados
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+        # Sólo se vaciaron los hijos: los atributos de la raíz siguen disponibles
+        root = eventos.root
     print("✅ Archivo cargado correctamente")
 
     # Información general del documento
@@ -42,9 +86,7 @@ try:
     print(f"Tipo: {root.get('TipoDeComprobante')}")
 
     # --- DATOS DEL EMISOR ---
-    # Buscar el elemento Emisor dentro del namespace 'cfdi'
     print("\n--- EMISOR ---")
-    emisor = root.find('cfdi:Emisor', namespaces)
     if emisor is not None:
         print(f"RFC: {emisor.get('Rfc')}")
         print(f"Nombre: {emisor.get('Nombre')}")
@@ -52,38 +94,33 @@ try:
 
     # --- DATOS DEL RECEPTOR ---
     print("\n--- RECEPTOR ---")
-    receptor = root.find('cfdi:Receptor', namespaces)
     if receptor is not None:
         print(f"RFC: {receptor.get('Rfc')}")
         print(f"Nombre: {receptor.get('Nombre')}")
         print(f"Uso CFDI: {receptor.get('UsoCFDI')}")
 
     # --- CONCEPTOS ---
-    # Obtener todos los conceptos y recorrerlos de forma numerada
-    conceptos = root.findall('cfdi:Conceptos/cfdi:Concepto', namespaces)
+    # Recorrer los conceptos de forma numerada
     print(f"\n--- CONCEPTOS ({len(conceptos)} encontrados) ---")
 
-    for i, concepto in enumerate(conceptos, 1):
+    for i, (descripcion, cantidad, valor_unitario, importe) in enumerate(conceptos, 1):
         print(f"Concepto {i}:")
-        print(f"  - Descripción: {concepto.get('Descripcion')}")
-        print(f"  - Cantidad: {concepto.get('Cantidad')}")
-        print(f"  - Valor Unitario: ${concepto.get('ValorUnitario')}")
-        print(f"  - Importe: ${concepto.get('Importe')}")
+        print(f"  - Descripción: {descripcion}")
+        print(f"  - Cantidad: {cantidad}")
+        print(f"  - Valor Unitario: ${valor_unitario}")
+        print(f"  - Importe: ${importe}")
 
     # --- TIMBRE FISCAL DIGITAL ---
-    # El timbre puede encontrarse en un namespace diferente (tfd)
+    # El timbre se encuentra en un namespace diferente (tfd)
     print("\n--- TIMBRE FISCAL ---")
-    timbre = root.find('.//tfd:TimbreFiscalDigital', namespaces)
     if timbre is not None:
         print(f"UUID: {timbre.get('UUID')}")
         print(f"Fecha Timbrado: {timbre.get('FechaTimbrado')}")
 
     # --- COMPLEMENTO DE PAGO (PAGOS 2.0) ---
-    pago = root.find('.//pago20:Pagos', namespaces)
-    if pago is not None:
+    if tiene_pagos:
         print(f"\n--- COMPLEMENTO DE PAGO ---")
         print("✅ Este CFDI incluye información de pago")
-        pago_detalle = root.find('.//pago20:Pago', namespaces)
         if pago_detalle is not None:
             print(f"Monto del pago: ${pago_detalle.get('Monto')}")
             print(f"Fecha del pago: {pago_detalle.get('FechaPago')}")
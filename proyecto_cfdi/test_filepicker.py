@@ -7,8 +7,12 @@ import os
 import asyncio
 import subprocess
 import platform
+import multiprocessing
+import queue
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
-from cfdi_tool.extractor import CFDIExtractor
+from cfdi_tool.extractor import EXTENSIONES_XML, enviar_en_ventana, precargar_archivos
 
 try:
     from cfdi_tool.excel_writer import exportar_a_excel
@@ -16,6 +20,41 @@ except ImportError:
     exportar_a_excel = None
 
 
+def listar_xml(carpeta):
+    """Devuelve las entradas XML de la carpeta en una sola pasada de scandir."""
+    with os.scandir(carpeta) as it:
+        return [entrada for entrada in it
+                if entrada.name.endswith(EXTENSIONES_XML) and entrada.is_file()]
+
+
+def _tamano(entrada):
+    """Tamaño del archivo, o 0 si ya no se puede consultar (p. ej. se borró)."""
+    try:
+        return entrada.stat().st_size
+    except OSError:
+        return 0
+
+
+def ordenar_por_tamano(entradas):
+    """Devuelve las entradas ordenadas de menor a mayor tamaño."""
+    return sorted(entradas, key=_tamano)
+
+
+async def encolar(cola, elemento, exportacion):
+    """Pone `elemento` en la cola acotada sin bloquear el event loop.
+
+    Si la cola está llena espera a que el escritor avance; devuelve False si
+    el escritor ya terminó (por ejemplo, por un error) y nadie la consumirá.
+    """
+    while not exportacion.done():
+        try:
+            cola.put_nowait(elemento)
+            return True
+        except queue.Full:
+            await asyncio.sleep(0.01)
+    return False
+
+
 class CFDIProcessorApp:
     """Aplicación GUI principal para procesamiento de CFDI."""
 
@@ -25,7 +64,7 @@ class CFDIProcessorApp:
         # Variables de estado
         self.carpeta_input: Optional[str] = None
         self.carpeta_output: Optional[str] = None
-        self.extractor = CFDIExtractor()
+        self._validacion_input: Optional[asyncio.Task] = None
         
         # Componentes UI
         self.txt_input = ft.TextField(
@@ -123,34 +162,52 @@ class CFDIProcessorApp:
             horizontal_alignment=ft.CrossAxisAlignment.CENTER
         )
 
-    def on_input_changed(self, e):
-        """Cuando el usuario escribe la ruta de entrada."""
-        ruta = e.control.value.strip().strip('"')  # Quitar comillas si las pega
+    async def on_input_changed(self, e):
+        """Cuando el usuario escribe la ruta de entrada.
+
+        Cada tecla cancela la validación pendiente: la carpeta sólo se revisa
+        cuando el usuario deja de escribir. Mientras tanto la carpeta anterior
+        deja de ser válida, para que un clic en "Procesar" no use la ruta vieja.
+        """
+        if self._validacion_input is not None:
+            self._validacion_input.cancel()
+        self.carpeta_input = None
+        self.check_enable_process_button()
+        self.page.update()
+        self._validacion_input = asyncio.ensure_future(self._validar_input(e.control))
+
+    async def _validar_input(self, control):
+        """Valida la carpeta de entrada tras una pausa de 250 ms al teclear.
+
+        La lectura del directorio se hace en un hilo para que la interfaz no
+        se congele con carpetas grandes o unidades de red.
+        """
+        await asyncio.sleep(0.25)
+        ruta = control.value.strip().strip('"')  # Quitar comillas si las pega
         
         if not ruta:
             self.carpeta_input = None
-            e.control.error_text = None
-            e.control.helper_text = None
+            control.error_text = None
+            control.helper_text = None
             self.check_enable_process_button()
             self.page.update()
             return
         
-        if os.path.exists(ruta) and os.path.isdir(ruta):
-            try:
-                archivos = [f for f in os.listdir(ruta) if f.lower().endswith('.xml')]
-                if archivos:
-                    self.carpeta_input = ruta
-                    e.control.error_text = None
-                    e.control.helper_text = f"✅ {len(archivos)} archivos XML encontrados"
-                else:
-                    self.carpeta_input = None
-                    e.control.error_text = "⚠️ No se encontraron archivos XML en esta carpeta"
-            except Exception as ex:
+        try:
+            archivos = await asyncio.to_thread(listar_xml, ruta)
+            if archivos:
+                self.carpeta_input = ruta
+                control.error_text = None
+                control.helper_text = f"✅ {len(archivos)} archivos XML encontrados"
+            else:
                 self.carpeta_input = None
-                e.control.error_text = f"❌ Error: {str(ex)}"
-        else:
+                control.error_text = "⚠️ No se encontraron archivos XML en esta carpeta"
+        except (FileNotFoundError, NotADirectoryError):
+            self.carpeta_input = None
+            control.error_text = "❌ La carpeta no existe o no es válida"
+        except Exception as ex:
             self.carpeta_input = None
-            e.control.error_text = "❌ La carpeta no existe o no es válida"
+            control.error_text = f"❌ Error: {str(ex)}"
         
         self.check_enable_process_button()
         self.page.update()
@@ -201,59 +258,108 @@ class CFDIProcessorApp:
         
         try:
             # Obtener archivos
-            archivos_xml = [f for f in os.listdir(self.carpeta_input) 
-                           if f.lower().endswith('.xml')]
+            archivos_xml = listar_xml(self.carpeta_input)
             total_archivos = len(archivos_xml)
             
             if total_archivos == 0:
                 await self.show_error("No se encontraron archivos XML.")
                 return
 
-            todos_los_datos = []
+            # Los más pequeños primero: terminan pronto y la barra de progreso
+            # avanza de forma pareja en lugar de a saltos. El stat de cada
+            # archivo se hace en un hilo para no detener el event loop.
+            archivos_xml = await asyncio.to_thread(ordenar_por_tamano, archivos_xml)
+
+            # Adelantar la lectura de disco en segundo plano mientras arranca
+            # el pool; no se espera su resultado
+            asyncio.get_running_loop().run_in_executor(
+                None, precargar_archivos, [entrada.path for entrada in archivos_xml]
+            )
+
+            if exportar_a_excel is None:
+                raise ImportError("No se pudo importar exportar_a_excel. Verifique que openpyxl esté instalado.")
+
+            nombre_excel = "reporte_cfdi.xlsx"
+            ruta_salida_excel = os.path.join(self.carpeta_output, nombre_excel)
+
+            procesados = 0
             errores = 0
-            
-            # Procesar cada archivo
-            for i, nombre_archivo in enumerate(archivos_xml):
-                self.txt_status.value = f"Procesando: {nombre_archivo}\n({i+1} de {total_archivos})"
-                self.progress_bar.value = (i + 1) / total_archivos
-                await self.page.update_async()
-                
-                ruta_completa = os.path.join(self.carpeta_input, nombre_archivo)
-                
-                try:
-                    datos_cfdi = await asyncio.to_thread(
-                        self.extractor.procesar_cfdi_completo, 
-                        ruta_completa
+            escritura_interrumpida = False
+
+            # El Excel se escribe en un hilo conforme llegan los resultados:
+            # el event loop los deposita en la cola y `None` marca el final.
+            # Tanto la cola como la ventana de envío están acotadas, así que
+            # en memoria sólo hay unos cuantos CFDI por worker, no el lote.
+            workers = os.cpu_count() or 1
+            cola = queue.Queue(maxsize=workers * 4)
+            exportacion = asyncio.ensure_future(
+                asyncio.to_thread(exportar_a_excel, iter(cola.get, None), ruta_salida_excel)
+            )
+
+            try:
+                # Cada XML es independiente: se reparten entre procesos para usar
+                # todos los núcleos. Los resultados se esperan en el orden de
+                # envío, así las filas del reporte siguen ese mismo orden.
+                with ProcessPoolExecutor(max_workers=workers) as ex:
+                    # Una sola marca de tiempo para todo el lote
+                    fecha_lote = datetime.now().isoformat()
+                    futuros = enviar_en_ventana(
+                        ex, (entrada.path for entrada in archivos_xml), fecha_lote,
+                        ventana=workers * 4,
                     )
-                    if datos_cfdi:
-                        todos_los_datos.append(datos_cfdi)
-                    else:
-                        errores += 1
-                except Exception as ex:
-                    print(f"Error procesando {nombre_archivo}: {ex}")
-                    errores += 1
-                
-                await asyncio.sleep(0.01)
 
-            # Generar Excel
+                    for i, (entrada, futuro) in enumerate(zip(archivos_xml, futuros)):
+                        nombre_archivo = entrada.name
+                        try:
+                            # wrap_future permite esperar sin bloquear el event loop
+                            datos_cfdi = await asyncio.wrap_future(futuro)
+                        except Exception as ex_archivo:
+                            print(f"Error procesando {nombre_archivo}: {ex_archivo}")
+                            datos_cfdi = None
+                        # Soltar el futuro: su resultado ya sólo vive en la cola
+                        futuro = None
+
+                        if datos_cfdi:
+                            if not await encolar(cola, datos_cfdi, exportacion):
+                                # El escritor terminó antes de tiempo (ya informó
+                                # su error); no tiene caso seguir parseando
+                                escritura_interrumpida = True
+                                break
+                            procesados += 1
+                        else:
+                            errores += 1
+
+                        # Refrescar la interfaz cada 16 archivos (y con el último):
+                        # cada actualización es un viaje de ida y vuelta al cliente
+                        if (i + 1) % 16 == 0 or i + 1 == total_archivos:
+                            self.txt_status.value = f"Procesando: {nombre_archivo}\n({i+1} de {total_archivos})"
+                            self.progress_bar.value = (i + 1) / total_archivos
+                            await self.page.update_async()
+            finally:
+                # Cerrar el flujo aunque el procesamiento falle, para liberar al hilo
+                await encolar(cola, None, exportacion)
+
+            # Terminar de escribir el Excel
             self.progress_bar.value = 1.0
             self.txt_status.value = "Generando archivo Excel..."
             await self.page.update_async()
-            
-            if not todos_los_datos:
+            escrito = await exportacion
+
+            if escritura_interrumpida:
+                await self.show_error("No se pudo terminar de escribir el archivo Excel.")
+                return
+
+            if not procesados:
                 await self.show_error("No se extrajeron datos válidos de ningún CFDI.")
                 return
 
-            nombre_excel = "reporte_cfdi.xlsx"
-            ruta_salida_excel = os.path.join(self.carpeta_output, nombre_excel)
-            
-            if exportar_a_excel is None:
-                raise ImportError("No se pudo importar exportar_a_excel. Verifique que pandas y openpyxl estén instalados.")
+            # Un archivo bloqueado o una ruta sin permisos no es un éxito
+            if not escrito:
+                await self.show_error("No se pudo escribir el archivo Excel.")
+                return
 
-            await asyncio.to_thread(exportar_a_excel, todos_los_datos, ruta_salida_excel)
-            
             # Mostrar éxito
-            await self.show_success(len(todos_los_datos), errores, nombre_excel)
+            await self.show_success(procesados, errores, nombre_excel)
             
         except Exception as ex:
             await self.show_error(f"Error inesperado:\n{str(ex)}")
@@ -347,5 +453,7 @@ def main(page: ft.Page):
 
 
 if __name__ == "__main__":
+    # Necesario para que el ProcessPoolExecutor funcione en ejecutables congelados
+    multiprocessing.freeze_support()
     print("🚀 Iniciando Procesador CFDI")
     ft.run(main)
\ No newline at end of file
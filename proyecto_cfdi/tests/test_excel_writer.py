@@ -10,6 +10,8 @@ if str(ROOT) not in sys.path:
 import importlib.util
 from pathlib import Path
 
+import pytest
+
 # Import module by path to avoid package import issues in test env
 mod_path = Path(__file__).resolve().parents[1] / 'cfdi_tool' / 'excel_writer.py'
 spec = importlib.util.spec_from_file_location('excel_writer_mod', str(mod_path))
@@ -42,3 +44,85 @@ def test_exportar_a_excel_crea_archivo(tmp_path):
 
     # Verificar que el archivo fue creado
     assert salida.exists()
+
+
+def test_exportar_a_excel_hojas_y_encabezados(tmp_path):
+    from openpyxl import load_workbook
+
+    datos = [
+        {
+            'datos_generales': {'serie': 'A', 'folio': '1', 'total': 116.0},
+            'emisor': {'rfc': 'DEMO010101001'},
+            'receptor': {'rfc': 'XAXX010101000'},
+            'conceptos': [
+                {'clave_prod_serv': '01010101', 'cantidad': 2.0, 'descripcion': 'Servicio', 'importe': 100.0}
+            ],
+            'timbre': {'uuid': 'TEST-UUID-1234'},
+            'complementos': {}
+        }
+    ]
+    salida = tmp_path / 'reporte_hojas.xlsx'
+
+    exportar_a_excel(datos, str(salida))
+
+    libro = load_workbook(salida, read_only=True)
+    # Sin complemento de pagos no se genera la hoja de documentos relacionados
+    assert libro.sheetnames == ['CFDI_General', 'Conceptos']
+
+    filas_general = list(libro['CFDI_General'].values)
+    assert filas_general[0] == excel_writer_mod.COLUMNAS_GENERAL
+    assert filas_general[1][0] == 'TEST-UUID-1234'
+
+    filas_conceptos = list(libro['Conceptos'].values)
+    assert filas_conceptos[0] == excel_writer_mod.COLUMNAS_CONCEPTOS
+    assert filas_conceptos[1][:4] == ('TEST-UUID-1234', '01010101', 'Servicio', 2)
+
+
+def test_exportar_a_parquet_crea_tablas(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    datos = [
+        {
+            'datos_generales': {'serie': 'A', 'folio': '1', 'total': 116.0},
+            'conceptos': [{'descripcion': 'Servicio', 'cantidad': 1.0, 'importe': 100.0}],
+            'timbre': {'uuid': 'TEST-UUID-1234'},
+            'complementos': {}
+        }
+    ]
+
+    excel_writer_mod.exportar_a_parquet(datos, str(tmp_path))
+
+    general = pq.read_table(tmp_path / 'cfdi_general.parquet')
+    assert general.column_names == list(excel_writer_mod.COLUMNAS_GENERAL)
+    # Sin traslados la tasa queda nula en lugar del marcador de texto
+    assert general.column('tasa_cuota').to_pylist() == [None]
+    conceptos = pq.read_table(tmp_path / 'cfdi_conceptos.parquet')
+    # Las cantidades se guardan como float64 aunque falten en algún concepto
+    assert str(conceptos.schema.field('Cantidad').type) == 'double'
+    assert conceptos.column('Descuento').to_pylist() == [None]
+    assert not (tmp_path / 'cfdi_documentos_relacionados.parquet').exists()
+
+
+def test_exportar_a_excel_acepta_generador(tmp_path):
+    from openpyxl import load_workbook
+
+    def generar():
+        for folio in ('1', '2'):
+            yield {'datos_generales': {'folio': folio}, 'timbre': {'uuid': f'UUID-{folio}'}}
+
+    salida = tmp_path / 'reporte_generador.xlsx'
+
+    assert exportar_a_excel(generar(), str(salida)) is True
+
+    filas = list(load_workbook(salida, read_only=True)['CFDI_General'].values)
+    assert [fila[0] for fila in filas[1:]] == ['UUID-1', 'UUID-2']
+
+
+def test_exportar_a_excel_indica_fallo_de_escritura(tmp_path):
+    datos = [{'datos_generales': {'folio': '1'}, 'timbre': {'uuid': 'UUID-1'}}]
+    # La carpeta de destino no existe: el archivo no se puede guardar
+    salida = tmp_path / 'no_existe' / 'reporte.xlsx'
+
+    assert exportar_a_excel(datos, str(salida)) is False
+    assert not salida.exists()
+    assert exportar_a_excel([], str(tmp_path / 'vacio.xlsx')) is False
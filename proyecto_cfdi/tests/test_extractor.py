@@ -47,3 +47,97 @@ def test_procesar_cfdi_completo(tmp_path):
     assert resultado['emisor']['rfc'] == 'DEMO010101001'
     assert resultado['receptor']['rfc'] == 'XAXX010101000'
     assert len(resultado['conceptos']) == 1
+
+
+def test_impuestos_totales_no_duplican_los_de_conceptos(tmp_path):
+    content = '''<?xml version="1.0" encoding="UTF-8"?>
+<cfdi:Comprobante Version="4.0" SubTotal="100" Total="116" TipoDeComprobante="I" xmlns:cfdi="http://www.sat.gob.mx/cfd/4">
+  <cfdi:Conceptos>
+    <cfdi:Concepto Cantidad="1" ValorUnitario="100" Importe="100">
+      <cfdi:Impuestos>
+        <cfdi:Traslados>
+          <cfdi:Traslado Base="100" Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.160000" Importe="16"/>
+        </cfdi:Traslados>
+      </cfdi:Impuestos>
+    </cfdi:Concepto>
+  </cfdi:Conceptos>
+  <cfdi:Impuestos TotalImpuestosTrasladados="16">
+    <cfdi:Traslados>
+      <cfdi:Traslado Base="100" Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.160000" Importe="16"/>
+    </cfdi:Traslados>
+  </cfdi:Impuestos>
+</cfdi:Comprobante>
+'''
+    path = tmp_path / "cfdi_impuestos.xml"
+    path.write_text(content, encoding='utf-8')
+
+    resultado = CFDIExtractor().procesar_cfdi_completo(str(path))
+
+    assert len(resultado['impuestos']['traslados']) == 1
+    assert resultado['impuestos']['traslados'][0]['importe'] == 16.0
+    assert resultado['impuestos']['retenciones'] == []
+    assert len(resultado['conceptos'][0]['impuestos']['traslados']) == 1
+
+
+def test_procesar_archivo_usa_fecha_de_lote(tmp_path):
+    archivo = minimal_cfdi_xml(tmp_path)
+
+    resultado = extractor_mod.procesar_archivo(archivo, '2025-12-31T00:00:00')
+
+    assert resultado['fecha_procesamiento'] == '2025-12-31T00:00:00'
+    assert resultado['emisor']['rfc'] == 'DEMO010101001'
+
+
+def test_precargar_archivos_ignora_rutas_inexistentes(tmp_path):
+    archivo = minimal_cfdi_xml(tmp_path)
+
+    # Sólo es una sugerencia al sistema operativo: nunca debe fallar
+    extractor_mod.precargar_archivos([archivo, str(tmp_path / 'no_existe.xml')])
+
+    assert extractor_mod.procesar_archivo(archivo) is not None
+
+
+def test_cargar_cfdi_sin_cache_por_defecto(tmp_path):
+    extractor = CFDIExtractor()
+    archivo = minimal_cfdi_xml(tmp_path)
+
+    assert extractor.cargar_cfdi(archivo) is not extractor.cargar_cfdi(archivo)
+
+
+def test_cargar_cfdi_reparsea_si_el_archivo_cambia(tmp_path):
+    extractor = CFDIExtractor(cachear=True)
+    archivo = minimal_cfdi_xml(tmp_path)
+
+    primera = extractor.cargar_cfdi(archivo)
+    assert extractor.cargar_cfdi(archivo) is primera
+
+    # Cambia el tamaño del archivo: la clave de caché deja de coincidir
+    path = Path(archivo)
+    path.write_text(path.read_text(encoding='utf-8').replace('Folio="1"', 'Folio="12"'),
+                    encoding='utf-8')
+
+    assert extractor.procesar_cfdi_completo(archivo)['datos_generales']['folio'] == '12'
+
+
+def test_enviar_en_ventana_limita_pendientes_y_conserva_orden(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    archivos = []
+    for i in range(10):
+        sub = tmp_path / str(i)
+        sub.mkdir()
+        archivos.append(minimal_cfdi_xml(sub))
+
+    enviados = []
+
+    class Pool(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            enviados.append(args[0])
+            return super().submit(fn, *args)
+
+    with Pool(max_workers=2) as ex:
+        futuros = extractor_mod.enviar_en_ventana(ex, archivos, 'X', ventana=3)
+        for i, futuro in enumerate(futuros):
+            # Nunca hay más de `ventana` archivos enviados sin consumir
+            assert len(enviados) - i <= 3
+            assert futuro.result()['archivo'] == archivos[i]